@@ -8,10 +8,14 @@ import string
 
 import app.extensions as extensions
 
+from app.middleware.dbRouting import init_db_routing
 from app.middleware.exceptionHandler import handle_exception
 from app.utils import safe_uuid
 from app.models.Users import Users
+from app.modules.inventory_images import resume_image_processing
+from app.modules.sales_ingestion import SalesIngestor
 from app.modules.scheduled_tasks import TaskScheduler
+from app.modules.schema_upgrades import upgrade_schema
 from app.routes.account import account
 from app.routes.authentication import authentication
 from app.routes.inventory import inventory
@@ -19,6 +23,7 @@ from app.routes.images import inv_images
 from app.routes.price_changes import price_changes
 from app.routes.suggestions import suggestions
 from app.routes.product_lookup import product_lookup
+from app.routes.sales import sales
 from app.routes.configurator import configurator
 from app.routes.archive import archive
 from app.routes.statistics import statistics
@@ -30,20 +35,46 @@ def on_server_shutdown():
     extensions.task_scheduler.stop()
 
 
-def create_default_config():
-    data = {
+def default_config() -> dict:
+    return {
         "threshold_restock_days": 7,
         "threshold_price_increase": 0.7,
         "threshold_price_decrease": -0.4,
         "multiplier_price_increase": 0.12,
         "multiplier_price_decrease": 0.2,
+        "suggestion_workers": 1,
+        "chart_backend": "pillow",
+        "chart_cache_max_mb": 100,
+        "chart_prerender_top_n": 20,
+        "incremental_suggestions": True,
         "scheduled_tasks": {
+            "sales_rollup": "01:30",
             "auto_suggestions": "02:00",
-            "auto_cleanup": "03:00"
+            "auto_cleanup": "03:00",
+            "auto_archive": "disabled",
+            "chart_prerender": "disabled"
         }
     }
+
+
+def create_default_config():
     with open("config.json", "w") as config_file:
-        config_file.write(json.dumps(data))
+        config_file.write(json.dumps(default_config()))
+
+
+def add_missing_config(data: dict) -> bool:
+    # ? Config files written by older versions lack the settings and scheduled tasks added since
+    changed = False
+    for key, value in default_config().items():
+        if key not in data:
+            data[key] = value
+            changed = True
+        elif key == "scheduled_tasks":
+            for task, schedule in value.items():
+                if task not in data[key]:
+                    data[key][task] = schedule
+                    changed = True
+    return changed
 
 
 def create_default_manager_account():
@@ -78,6 +109,9 @@ def create_app(config_class=Config):
     # Load configuration file
     with open("config.json", "r") as config_file:
         Config.CONFIG_DATA = json.load(config_file)
+    if add_missing_config(Config.CONFIG_DATA):
+        with open("config.json", "w") as config_file:
+            config_file.write(json.dumps(Config.CONFIG_DATA))
 
     with app.app_context() as ctx:
         # Create database tables
@@ -87,9 +121,14 @@ def create_app(config_class=Config):
         from app.models.PurchasedProducts import PurchasedProducts
         from app.models.SuggestedModifications import SuggestedModifications
         from app.models.ArchivedInventory import ArchivedInventory
+        from app.models.TaskWatermarks import TaskWatermarks
+        from app.models.DailyProductSales import DailyProductSales
+        from app.models.SchemaVersion import SchemaVersion
+        from app.models.Products import Products
 
         extensions.db.create_all()
         extensions.db.session.commit()
+        upgrade_schema()
 
         # Create default manager account if it doesn't exist
         if Users.query.filter(Users.roles.like("%ROLE_MANAGER%")).count() == 0:
@@ -99,6 +138,12 @@ def create_app(config_class=Config):
         extensions.task_scheduler = TaskScheduler()
         extensions.task_scheduler.start()
 
+    # Create the group commit writer for sales ingestion
+    extensions.sales_ingestor = SalesIngestor(app)
+
+    # Process the image uploads left over by the previous run
+    resume_image_processing(app)
+
     # Register exit handler
     atexit.register(on_server_shutdown)
 
@@ -111,10 +156,14 @@ def create_app(config_class=Config):
     app.register_blueprint(suggestions)
     app.register_blueprint(price_changes)
     app.register_blueprint(product_lookup)
+    app.register_blueprint(sales)
     app.register_blueprint(configurator)
     app.register_blueprint(archive)
     app.register_blueprint(tests)
 
+    # Route the reads of GET endpoints to the read replica, if one is configured
+    init_db_routing(app, extensions.db)
+
     # Register error handler
     app.register_error_handler(Exception, handle_exception)
 
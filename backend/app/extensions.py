@@ -1,4 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from app.middleware.dbRouting import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 task_scheduler = None
+sales_ingestor = None
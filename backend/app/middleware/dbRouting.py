@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from flask import request
+from flask_sqlalchemy.session import Session
+from threading import Lock
+from time import monotonic
+from sqlalchemy import Select, event
+
+from config import Config
+
+
+REPLICA_BIND = "replica"
+
+recent_writers = {}     # access token -> sticky until
+recent_writers_lock = Lock()
+
+
+class RoutingSession(Session):
+    """Sends plain SELECTs to the read replica while `use_replica` is set in the session info.
+
+    Everything else (flushes, DML, locking reads, raw SQL) and every statement after the session wrote
+    something goes to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("use_replica") and not self._flushing and REPLICA_BIND in self._db.engines \
+                and isinstance(clause, Select) and clause._for_update_arg is None:
+            return self._db.engines[REPLICA_BIND]
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def stick_to_primary_after_flush(session, flush_context):
+    # ? Read-after-write, the rest of the request has to see its own changes
+    session.info.pop("use_replica", None)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def stick_to_primary_after_dml(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info.pop("use_replica", None)
+
+
+@contextmanager
+def primary_reads(session):
+    use_replica = session.info.pop("use_replica", None)
+    try:
+        yield
+    finally:
+        if use_replica:
+            session.info["use_replica"] = use_replica
+
+
+def writer_key() -> str:
+    return request.headers.get('x-access-token') or request.args.get('token') or request.remote_addr
+
+
+def is_recent_writer() -> bool:
+    with recent_writers_lock:
+        return recent_writers.get(writer_key(), 0) > monotonic()
+
+
+def init_db_routing(app, db):
+    if not app.config.get("SQLALCHEMY_BINDS", {}).get(REPLICA_BIND):
+        return
+
+    @app.before_request
+    def route_reads_to_replica():
+        if request.method in ['GET', 'HEAD'] and request.blueprint in Config.REPLICA_BLUEPRINTS and not is_recent_writer():
+            db.session.info["use_replica"] = True
+
+    @app.after_request
+    def remember_writers(response):
+        # ? Clients that just wrote read from the primary for a while, the replica may lag behind their changes
+        if request.method not in ['GET', 'HEAD', 'OPTIONS'] and response.status_code < 400:
+            with recent_writers_lock:
+                now = monotonic()
+                if len(recent_writers) >= Config.REPLICA_STICKY_SIZE:
+                    for key in [key for key, sticky_until in recent_writers.items() if sticky_until <= now]:
+                        del recent_writers[key]
+                recent_writers[writer_key()] = now + Config.REPLICA_STICKY_SECONDS
+        return response
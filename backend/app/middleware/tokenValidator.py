@@ -1,10 +1,63 @@
+from collections import OrderedDict, namedtuple
 from flask import jsonify, make_response, request
 from functools import wraps
+from threading import Lock
+from time import monotonic
 import jwt
+from app.extensions import db
+from app.middleware.dbRouting import primary_reads
 from app.models.Users import Users
 from config import Config
 
 
+# ? Read-only snapshot of an authenticated user, detached from the database session
+CachedUser = namedtuple(
+    'CachedUser', ['id', 'public_id', 'name', 'username', 'roles'])
+
+user_cache = OrderedDict()     # public_id -> (expires_at, CachedUser), least recently used first
+user_cache_lock = Lock()
+user_cache_generation = 0
+
+
+def get_cached_user(public_id: str) -> CachedUser:
+    with user_cache_lock:
+        entry = user_cache.get(public_id)
+        if entry is not None:
+            user_cache.move_to_end(public_id)
+        generation = user_cache_generation
+    if entry is not None and entry[0] > monotonic():
+        return entry[1]
+
+    user = Users.query.filter_by(public_id=public_id).first()
+    if user is None and db.session.info.get("use_replica"):
+        # ? Accounts created moments ago may not have reached the read replica yet
+        with primary_reads(db.session):
+            user = Users.query.filter_by(public_id=public_id).first()
+    if user is None:
+        return None
+
+    snapshot = CachedUser(user.id, user.public_id, user.name,
+                          user.username, tuple(user.roles or []))
+    with user_cache_lock:
+        # ? Don't store a snapshot read before an eviction
+        if generation == user_cache_generation:
+            user_cache[public_id] = (
+                monotonic() + Config.USER_CACHE_TTL, snapshot)
+            user_cache.move_to_end(public_id)
+            while len(user_cache) > Config.USER_CACHE_SIZE:
+                user_cache.popitem(last=False)
+    return snapshot
+
+
+def evict_cached_user(*public_ids: str):
+    global user_cache_generation
+
+    with user_cache_lock:
+        user_cache_generation += 1
+        for public_id in public_ids:
+            user_cache.pop(public_id, None)
+
+
 def token_required(f):
     @wraps(f)
     def decorator(*args, **kwargs):
@@ -20,8 +73,7 @@ def token_required(f):
         try:
             data = jwt.decode(
                 token, Config.SECRET_KEY, algorithms=["HS256"])
-            current_user = Users.query.filter_by(
-                public_id=data['public_id']).first()
+            current_user = get_cached_user(data['public_id'])
             assert (current_user is not None)
         except:
             return make_response(jsonify({'message': 'token is invalid'}), 401)
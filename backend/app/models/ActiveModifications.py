@@ -1,7 +1,18 @@
+from sqlalchemy.orm import validates
+
 from app.extensions import db
 
 
 class ActiveModifications(db.Model):
+    __table_args__ = (
+        # ? Change barcode lookups take the latest change of a stem
+        db.Index('ix_active_modifications_stem_approved',
+                 'modification_barcode_stem', 'approved_at'),
+        db.Index('ix_active_modifications_inventory_approved',
+                 'inventory_id', 'approved_at'),
+        db.Index('ix_active_modifications_approved_at', 'approved_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     inventory_id = db.Column(db.String(36), db.ForeignKey(
         'inventory.id', ondelete='CASCADE'))
@@ -11,6 +22,15 @@ class ActiveModifications(db.Model):
     automatic = db.Column(db.Boolean(), default=False)
     new_price = db.Column(db.Numeric(precision=5, scale=2))
     modification_barcode = db.Column(db.String(25), nullable=True)
+    modification_barcode_stem = db.Column(
+        db.String(25), nullable=True, index=True)
+
+    @validates('modification_barcode')
+    def update_barcode_stem(self, key, barcode):
+        from app.utils import barcode_stem
+
+        self.modification_barcode_stem = barcode_stem(barcode)
+        return barcode
 
     def serialize(self):
         return {
@@ -3,9 +3,11 @@ from app.extensions import db
 
 class ArchivedInventory(db.Model):
     id = db.Column(db.String(36), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey(
+        'products.id', ondelete='SET NULL'), nullable=True, index=True)
     product_name = db.Column(db.String(255))
     product_image = db.Column(db.String(255), nullable=True)
-    product_barcode = db.Column(db.String(25))
+    product_barcode = db.Column(db.String(25), index=True)
     product_amount = db.Column(db.Numeric(precision=7, scale=3))
     product_remain = db.Column(db.Numeric(precision=7, scale=3))
     inventory_date = db.Column(db.DateTime)
@@ -14,11 +16,12 @@ class ArchivedInventory(db.Model):
     modifiable = db.Column(db.Boolean())
     archived_by = db.Column(db.Integer, db.ForeignKey(
         'users.id', ondelete='SET NULL'), nullable=True)
-    archived_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=True, index=True)
 
     def serialize(self):
         return {
             "id": self.id,
+            "product_id": self.product_id,
             "product_name": self.product_name,
             "product_image": self.product_image,
             "product_barcode": self.product_barcode,
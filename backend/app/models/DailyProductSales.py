@@ -0,0 +1,27 @@
+from app.extensions import db
+
+
+class DailyProductSales(db.Model):
+    __table_args__ = (
+        db.Index('ix_daily_product_sales_product_day', 'product_id', 'day'),
+    )
+
+    product_name = db.Column(db.String(255), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey(
+        'products.id', ondelete='SET NULL'), nullable=True)
+    day = db.Column(db.Date, primary_key=True)
+    units = db.Column(db.Numeric(precision=10, scale=3), default=0)
+    revenue = db.Column(db.Numeric(precision=12, scale=2), default=0)
+    discounted_units = db.Column(db.Numeric(precision=10, scale=3), default=0)
+    profit_units = db.Column(db.Numeric(precision=10, scale=3), default=0)
+
+    def serialize(self):
+        return {
+            "product_name": self.product_name,
+            "product_id": self.product_id,
+            "day": self.day.strftime("%Y.%m.%d"),
+            "units": self.units,
+            "revenue": self.revenue,
+            "discounted_units": self.discounted_units,
+            "profit_units": self.profit_units
+        }
@@ -1,11 +1,30 @@
+from sqlalchemy.orm import validates
+
 from app.extensions import db
 
 
 class Inventory(db.Model):
+    __table_args__ = (
+        # ? Barcode lookups and FIFO stock decrements read a product's lots by date
+        db.Index('ix_inventory_stem_date',
+                 'product_barcode_stem', 'inventory_date'),
+        # ? Lots of a product, newest lot price in the sales statistics
+        db.Index('ix_inventory_product_name_date',
+                 'product_name', 'inventory_date'),
+        db.Index('ix_inventory_product_date',
+                 'product_id', 'inventory_date'),
+        db.Index('ix_inventory_expiry_date', 'expiry_date'),
+        db.Index('ix_inventory_modified_at', 'modified_at'),
+        db.Index('ix_inventory_product_remain', 'product_remain'),
+    )
+
     id = db.Column(db.String(36), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey(
+        'products.id', ondelete='SET NULL'), nullable=True, index=True)
     product_name = db.Column(db.String(255))
     product_image = db.Column(db.String(255), nullable=True)
     product_barcode = db.Column(db.String(25))
+    product_barcode_stem = db.Column(db.String(25), index=True)
     product_amount = db.Column(db.Numeric(precision=7, scale=3))
     product_remain = db.Column(db.Numeric(precision=7, scale=3))
     inventory_date = db.Column(db.DateTime)
@@ -18,9 +37,17 @@ class Inventory(db.Model):
         db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
     modified_at = db.Column(db.DateTime, nullable=True)
 
+    @validates('product_barcode')
+    def update_barcode_stem(self, key, barcode):
+        from app.utils import barcode_stem
+
+        self.product_barcode_stem = barcode_stem(barcode)
+        return barcode
+
     def serialize(self):
         return {
             'id': self.id,
+            'product_id': self.product_id,
             'product_name': self.product_name,
             'product_image': self.product_image,
             'product_barcode': self.product_barcode,
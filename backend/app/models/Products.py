@@ -0,0 +1,14 @@
+from app.extensions import db
+
+
+class Products(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), unique=True, index=True)
+    barcode = db.Column(db.String(25), nullable=True)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "barcode": self.barcode
+        }
@@ -2,9 +2,21 @@ from app.extensions import db
 
 
 class PurchasedProducts(db.Model):
+    __table_args__ = (
+        # ? Sales of a product (statistics, rollup) and products sold after a transaction (incremental suggestions)
+        db.Index('ix_purchased_products_product_transaction',
+                 'product_name', 'transaction_id'),
+        db.Index('ix_purchased_products_transaction_product',
+                 'transaction_id', 'product_name'),
+        db.Index('ix_purchased_products_product_id_transaction',
+                 'product_id', 'transaction_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     transaction_id = db.Column(db.Integer, db.ForeignKey(
         'transactions.id'))
+    product_id = db.Column(db.Integer, db.ForeignKey(
+        'products.id', ondelete='SET NULL'), nullable=True, index=True)
     product_name = db.Column(db.String(255))
     item_count = db.Column(db.Numeric(precision=7, scale=3))
     payed_price = db.Column(db.Numeric(precision=6, scale=2))
@@ -13,6 +25,7 @@ class PurchasedProducts(db.Model):
         return {
             "id": self.id,
             "transaction_id": self.transaction_id,
+            "product_id": self.product_id,
             "product_name": self.product_name,
             "item_count": self.item_count,
             "payed_price": self.payed_price
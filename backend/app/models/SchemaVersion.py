@@ -0,0 +1,14 @@
+from app.extensions import db
+
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100))
+    applied_at = db.Column(db.DateTime)
+
+    def serialize(self):
+        return {
+            "version": self.version,
+            "name": self.name,
+            "applied_at": self.applied_at.strftime("%Y.%m.%d %H:%M:%S") if self.applied_at else None
+        }
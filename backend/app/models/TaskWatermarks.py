@@ -0,0 +1,14 @@
+from app.extensions import db
+
+
+class TaskWatermarks(db.Model):
+    task = db.Column(db.String(50), primary_key=True)
+    last_run_at = db.Column(db.DateTime)
+    last_transaction_id = db.Column(db.Integer, nullable=True)
+
+    def serialize(self):
+        return {
+            "task": self.task,
+            "last_run_at": self.last_run_at.strftime("%Y.%m.%d %H:%M:%S") if self.last_run_at else None,
+            "last_transaction_id": self.last_transaction_id
+        }
@@ -3,7 +3,7 @@ from app.extensions import db
 
 class Transactions(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.DateTime)
+    date = db.Column(db.DateTime, index=True)
     total_price = db.Column(db.Numeric(precision=7, scale=2))
 
     def serialize(self):
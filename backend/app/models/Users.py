@@ -3,9 +3,9 @@ from app.extensions import db
 
 class Users(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    public_id = db.Column(db.String(36))
+    public_id = db.Column(db.String(36), index=True)
     name = db.Column(db.String(50))
-    username = db.Column(db.String(25))
+    username = db.Column(db.String(25), index=True)
     password = db.Column(db.String(162))
     roles = db.Column(db.JSON)
 
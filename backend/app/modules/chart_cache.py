@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import date
+from threading import Lock
+
+from config import Config
+
+
+class ChartCache:
+    """Size-bounded, least recently used cache of rendered chart images stored on disk."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.lock = Lock()
+        self.total_size = None
+
+    def key(self, chart: str, product_name: str, data) -> str:
+        # ? Hashing the aggregated data means new sales produce a new key instead of serving a stale chart
+        payload = json.dumps([chart, product_name, date.today().isoformat(), data], default=str, sort_keys=True)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.jpg")
+
+    def get(self, key: str) -> bytes:
+        try:
+            with open(self.path(key), 'rb') as file:
+                image = file.read()
+            # ? The modification time doubles as the last access time for the LRU eviction
+            os.utime(self.path(key))
+            return image
+        except OSError:
+            return None
+
+    def put(self, key: str, image: bytes):
+        os.makedirs(self.folder, exist_ok=True)
+        # ? Unique per call, requests rendering the same chart at once must not share a temporary file
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=self.folder, prefix=f"{key}.", suffix=".tmp")
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(image)
+
+        with self.lock:
+            try:
+                replaced_size = os.path.getsize(self.path(key))
+            except OSError:
+                replaced_size = 0
+            os.replace(temp_path, self.path(key))
+
+            if self.total_size is None:
+                self.total_size = self.folder_size()
+            else:
+                self.total_size += len(image) - replaced_size
+
+            if self.total_size > Config.CONFIG_DATA.get("chart_cache_max_mb", 100) * 1024 * 1024:
+                self.evict()
+
+    def folder_size(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.folder) if entry.name.endswith(".jpg"))
+
+    def evict(self):
+        # ? Drop the least recently used charts until the cache is back to 80% of its size limit
+        max_size = Config.CONFIG_DATA.get("chart_cache_max_mb", 100) * 1024 * 1024
+        entries = sorted([entry for entry in os.scandir(self.folder) if entry.name.endswith(".jpg")],
+                         key=lambda entry: entry.stat().st_mtime)
+        self.total_size = sum(entry.stat().st_size for entry in entries)
+
+        for entry in entries:
+            if self.total_size <= max_size * 0.8:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.total_size -= size
+            except OSError:
+                pass
+
+
+chart_cache = ChartCache(Config.CHART_CACHE_FOLDER)
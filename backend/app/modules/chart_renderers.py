@@ -0,0 +1,207 @@
+from functools import lru_cache
+from io import BytesIO
+import math
+import textwrap
+from PIL import Image, ImageDraw, ImageFont
+
+from config import Config
+
+
+COLORS = ['#636efa', '#ef553b', '#00cc96', '#ab63fa']
+DISTRIBUTION_LABELS = ['Sold at base price',
+                       'Sold at discount', 'Sold at profit', 'Disposed']
+
+
+@lru_cache(maxsize=None)
+def font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def nice_step(max_value: float, ticks: int = 5) -> float:
+    # ? Round the axis step to 1, 2, 2.5 or 5 times a power of ten
+    raw_step = max_value / ticks
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    for multiplier in [1, 2, 2.5, 5, 10]:
+        if raw_step <= multiplier * magnitude:
+            return multiplier * magnitude
+    return 10 * magnitude
+
+
+def draw_centered(draw: ImageDraw.ImageDraw, position: tuple, text: str, size: int, fill='#2a3f5f'):
+    draw.text(position, text, font=font(size), fill=fill, anchor='mm')
+
+
+class PillowRenderer:
+    """Draws the charts directly with Pillow, without starting a browser like kaleido does."""
+    name = "pillow"
+
+    def sales_distribution(self, product_name: str, distr: dict) -> bytes:
+        image = Image.new('RGB', (1000, 1500), 'white')
+        draw = ImageDraw.Draw(image)
+        draw_centered(draw, (500, 60), "Sales distribution", 40)
+
+        values = [float(distr[key]) for key in [
+            'sold_base_price', 'sold_discount', 'sold_profit', 'disposed']]
+        total = sum(values)
+        if distr['sales_count'] > 0 and total > 0:
+            # ? Slices start at 12 o'clock and go clockwise, like plotly's pie charts
+            box = (150, 150, 850, 850)
+            angle = -90
+            for value, color in zip(values, COLORS):
+                if value <= 0:
+                    continue
+                sweep = value / total * 360
+                draw.pieslice(box, angle, angle + sweep,
+                              fill=color, outline='white', width=3)
+                middle = math.radians(angle + sweep / 2)
+                if sweep >= 12:
+                    draw_centered(draw, (500 + 230 * math.cos(middle), 500 + 230 * math.sin(middle)),
+                                  f"{value / total * 100:.1f}%", 30, fill='white')
+                angle += sweep
+
+            for index, (label, color) in enumerate(zip(DISTRIBUTION_LABELS, COLORS)):
+                top = 1200 + index * 55
+                draw.rectangle((300, top, 340, top + 40), fill=color)
+                draw.text((360, top + 20), label, font=font(32),
+                          fill='#2a3f5f', anchor='lm')
+        else:
+            draw_centered(draw, (500, 500),
+                          "Not enough data to generate a chart", 45)
+
+        for index, line in enumerate(textwrap.wrap(product_name, width=50)):
+            draw_centered(draw, (500, 1000 + index * 45), line, 32)
+
+        return self.encode(image)
+
+    def line_chart(self, title: str, report: dict) -> bytes:
+        # ? Drawn in landscape and turned in memory, so the JPEG is only encoded once
+        image = Image.new('RGB', (1500, 1000), 'white')
+        draw = ImageDraw.Draw(image)
+        draw.text((80, 50), title, font=font(36), fill='#2a3f5f', anchor='lm')
+
+        left, top, right, bottom = 150, 120, 1450, 820
+        draw.rectangle((left, top, right, bottom), fill='#e5ecf6')
+
+        labels = list(report.keys())
+        values = [float(value) for value in report.values()]
+        step = nice_step(max(values)) if len(values) > 0 and max(values) > 0 else 1
+        y_max = step * math.ceil(max(values + [step]) / step)
+
+        def y_position(value):
+            return bottom - (value / y_max) * (bottom - top)
+
+        tick = 0
+        while tick <= y_max:
+            draw.line((left, y_position(tick), right, y_position(tick)),
+                      fill='white', width=2)
+            draw.text((left - 15, y_position(tick)), f"{tick:g}", font=font(26),
+                      fill='#2a3f5f', anchor='rm')
+            tick += step
+
+        if len(values) > 0:
+            spacing = (right - left - 60) / max(len(values) - 1, 1)
+            points = [(left + 30 + index * spacing, y_position(value))
+                      for index, value in enumerate(values)]
+
+            label_width = font(24).getlength(max(labels, key=len)) + 30
+            label_every = max(1, math.ceil(label_width / spacing)) if len(values) > 1 else 1
+            for index, (x, _) in enumerate(points):
+                if index % label_every == 0:
+                    draw.text((x, bottom + 40), labels[index], font=font(24),
+                              fill='#2a3f5f', anchor='mm')
+
+            if len(points) > 1:
+                draw.line(points, fill=COLORS[0], width=5, joint='curve')
+            for x, y in points:
+                draw.ellipse((x - 7, y - 7, x + 7, y + 7), fill=COLORS[0])
+
+        return self.encode(image.transpose(Image.ROTATE_270))
+
+    def encode(self, image: Image.Image) -> bytes:
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=90, optimize=True)
+        return buffer.getvalue()
+
+
+class PlotlyRenderer:
+    """Renders the charts with plotly and kaleido."""
+    name = "plotly"
+
+    def sales_distribution(self, product_name: str, distr: dict) -> bytes:
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+
+        split_title = textwrap.wrap(product_name, width=50)
+
+        # ? Create the pie chart
+        fig = make_subplots(rows=2, cols=1, specs=[[{'type': 'domain'}], [
+                            {}]], row_heights=[0.75, 0.25])
+        if distr['sales_count'] > 0:
+            fig.add_trace(go.Pie(labels=DISTRIBUTION_LABELS, values=[
+                distr['sold_base_price'], distr['sold_discount'], distr['sold_profit'], distr['disposed']]), row=1, col=1)
+        else:
+            fig.add_annotation(text="Not enough data to generate a chart", font_size=45,
+                               xref="paper", yref="paper", x=0.5, y=0.75, showarrow=False)
+        fig.add_annotation(
+            text="<br>".join(split_title), font_size=32, xref="paper", yref="paper", x=0.5, y=0.25, showarrow=False)
+
+        fig.update_layout(
+            title={
+                'text': "Sales distribution",
+                'y': 0.98,
+                'x': 0.5,
+                'xanchor': 'center',
+                'yanchor': 'top'
+            },
+            legend={
+                "yanchor": "bottom",
+                "y": 0,
+                "xanchor": "center",
+                "x": 0.5
+            },
+            font={
+                "size": 32
+            }
+        )
+
+        return fig.to_image(format="jpg", width=1000, height=1500)
+
+    def line_chart(self, title: str, report: dict) -> bytes:
+        import plotly.graph_objects as go
+
+        # ? Create the line chart
+        fig = go.Figure(
+            [go.Scatter(x=list(report.keys()), y=list(report.values()))])
+
+        fig.update_layout(
+            title=title,
+            legend=dict(
+                yanchor="bottom",
+                y=0,
+                xanchor="center",
+                x=0.5
+            ),
+            font=dict(
+                size=30
+            ),
+        )
+
+        img_bytes = fig.to_image(format="jpg", width=1500, height=1000)
+
+        img_rotated = Image.open(BytesIO(img_bytes)).transpose(Image.ROTATE_270)
+        img = BytesIO()
+        img_rotated.save(img, format="JPEG", quality=100)
+        return img.getvalue()
+
+
+RENDERERS = {
+    PillowRenderer.name: PillowRenderer(),
+    PlotlyRenderer.name: PlotlyRenderer()
+}
+
+
+def get_chart_renderer():
+    return RENDERERS.get(Config.CONFIG_DATA.get("chart_backend", "pillow"), RENDERERS["pillow"])
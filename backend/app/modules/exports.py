@@ -0,0 +1,42 @@
+import csv
+import io
+from flask import Response, current_app, stream_with_context
+
+from config import Config
+
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def ndjson_lines(items):
+    for item in items:
+        yield current_app.json.dumps(item) + "\n"
+
+
+def csv_lines(items):
+    buffer = io.StringIO()
+    writer = None
+
+    for item in items:
+        # ? The header is taken from the first row, all rows of an export serialize to the same keys
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(item.keys()))
+            writer.writeheader()
+        writer.writerow(item)
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_response(query, serialize, export_format: str, filename: str) -> Response:
+    # ? Rows are fetched in batches and written out as they come, so the export runs in constant memory
+    items = (serialize(row)
+             for row in query.yield_per(Config.EXPORT_BATCH_SIZE))
+    lines = ndjson_lines(items) if export_format == "ndjson" else csv_lines(items)
+
+    return Response(stream_with_context(lines), mimetype=EXPORT_FORMATS[export_format], headers={
+        'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'})
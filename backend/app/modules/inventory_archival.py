@@ -0,0 +1,59 @@
+from datetime import date, datetime
+from sqlalchemy import delete, insert, literal, select
+
+from app.extensions import db
+from app.models.ArchivedInventory import ArchivedInventory
+from app.models.Inventory import Inventory
+from app.models.SuggestedModifications import SuggestedModifications
+from app.modules.lookup_cache import invalidate_products
+from app.modules.search_index import register_search_changes
+
+
+ARCHIVE_CHUNK_SIZE = 1000
+
+
+def archive_lots(lots_filter, archived_by: int = None) -> int:
+    """Moves every lot matching `lots_filter` to the archive in one transaction, returns the number of archived lots."""
+    # ? The ids are read first so the INSERT ... SELECT and the DELETE work on exactly the same lots
+    lots = Inventory.query.with_entities(
+        Inventory.id, Inventory.product_barcode_stem).filter(lots_filter).all()
+    lot_ids = [lot.id for lot in lots]
+    archived_at = datetime.now()
+
+    for start in range(0, len(lot_ids), ARCHIVE_CHUNK_SIZE):
+        chunk = lot_ids[start:start + ARCHIVE_CHUNK_SIZE]
+
+        #! Replace the older archive entries of the same lots
+        db.session.execute(delete(ArchivedInventory).where(ArchivedInventory.id.in_(chunk)).execution_options(
+            lookup_cache_synced=True, synchronize_session=False))
+
+        db.session.execute(insert(ArchivedInventory).from_select(
+            ['id', 'product_id', 'product_name', 'product_barcode', 'base_price', 'product_amount', 'product_remain',
+                'inventory_date', 'expiry_date', 'modifiable', 'archived_by', 'archived_at'],
+            select(Inventory.id, Inventory.product_id, Inventory.product_name, Inventory.product_barcode, Inventory.base_price, Inventory.product_amount, Inventory.product_remain, Inventory.inventory_date, Inventory.expiry_date, Inventory.modifiable,
+                   literal(archived_by, ArchivedInventory.archived_by.type), literal(archived_at, ArchivedInventory.archived_at.type)).where(Inventory.id.in_(chunk))
+        ).execution_options(lookup_cache_synced=True))
+
+        db.session.execute(delete(Inventory).where(Inventory.id.in_(chunk)).execution_options(
+            lookup_cache_synced=True, search_index_synced=True, synchronize_session=False))
+
+    if len(lots) > 0:
+        invalidate_products(
+            db.session, {lot.product_barcode_stem for lot in lots}, set(lot_ids))
+        register_search_changes(db.session, {}, set(lot_ids))
+
+    db.session.commit()
+    return len(lot_ids)
+
+
+def expired_lots():
+    return Inventory.expiry_date < date.today()
+
+
+def disposable_lots():
+    return Inventory.id.in_(SuggestedModifications.query.with_entities(
+        SuggestedModifications.inventory_id).filter(SuggestedModifications.type == "Dispose"))
+
+
+def auto_archive():
+    archive_lots(expired_lots() | disposable_lots())
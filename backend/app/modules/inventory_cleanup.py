@@ -1,12 +1,61 @@
+import os
+from sqlalchemy import delete
+
 from app.models.Inventory import Inventory
 from app.extensions import db
+from app.modules.lookup_cache import invalidate_products
+from app.modules.search_index import register_search_changes
+from config import Config
+
+
+CLEANUP_CHUNK_SIZE = 1000
+
+
+def remove_lot_images(lot_ids: set) -> tuple:
+    """Removes the uploaded images of the given lots in one pass over the upload folder, returns (files, bytes)."""
+    removed_files = 0
+    removed_bytes = 0
+
+    if len(lot_ids) == 0 or not os.path.isdir(Config.UPLOAD_FOLDER):
+        return removed_files, removed_bytes
+
+    with os.scandir(Config.UPLOAD_FOLDER) as entries:
+        for entry in entries:
+            # ? Images are stored as <lot id>.<extension>, uploads still being processed as .<lot id>.<state>
+            if not entry.is_file() or entry.name.lstrip(".").split(".", 1)[0] not in lot_ids:
+                continue
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            removed_files += 1
+            removed_bytes += size
+
+    return removed_files, removed_bytes
+
+
+def remove_empty_lots() -> dict:
+    removed_ids = set()
+
+    while True:
+        lots = Inventory.query.with_entities(Inventory.id, Inventory.product_barcode_stem).filter(
+            Inventory.product_remain == 0).limit(CLEANUP_CHUNK_SIZE).all()
+        if len(lots) == 0:
+            break
 
+        chunk = {lot.id for lot in lots}
+        db.session.execute(delete(Inventory).where(Inventory.id.in_(chunk)).execution_options(
+            lookup_cache_synced=True, search_index_synced=True, synchronize_session=False))
+        invalidate_products(
+            db.session, {lot.product_barcode_stem for lot in lots}, chunk)
+        register_search_changes(db.session, {}, chunk)
+        db.session.commit()
 
-def remove_empty_lots():
-    lots = Inventory.query.with_entities(Inventory).filter(
-        Inventory.product_remain == 0).all()
+        removed_ids.update(chunk)
 
-    for lot in lots:
-        db.session.delete(lot)
+    removed_files, removed_bytes = remove_lot_images(removed_ids)
+    print(
+        f"[INVENTORY CLEANUP] Removed {len(removed_ids)} empty lots and {removed_files} images ({removed_bytes} bytes)")
 
-    db.session.commit()
+    return {"lots": len(removed_ids), "images": removed_files, "bytes": removed_bytes}
@@ -0,0 +1,219 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+from glob import glob
+from threading import Lock
+from time import monotonic
+from flask import current_app
+from PIL import Image, features
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models.Inventory import Inventory
+from config import Config
+
+
+ORIGINAL_SIZE = 500
+VARIANT_SIZES = {"small": 160, "medium": 320}
+IMAGE_FORMATS = {"JPEG": "jpeg", "PNG": "png"}
+
+
+def variant_filename(id: str, size: str, image_format: str) -> str:
+    # ? <id>.<format> is the original, the variants keep the <id>. prefix so the lot's image globs still match them
+    return f"{id}.{image_format}" if size == "original" else f"{id}.{size}.{image_format}"
+
+
+def save_image_variants(id: str, image: Image.Image, image_format: str) -> list:
+    """Saves the original (at most ORIGINAL_SIZE px) and the pre-sized variants of a lot image, returns the file names."""
+    # ? JPEGs get decoded straight at 1/2 to 1/8 scale, as long as that still leaves ORIGINAL_SIZE px
+    image.draft('RGB', (ORIGINAL_SIZE, ORIGINAL_SIZE))
+    image = image.convert('RGB')
+    image.thumbnail((ORIGINAL_SIZE, ORIGINAL_SIZE))
+
+    variants = [("original", image)]
+    for size, pixels in VARIANT_SIZES.items():
+        variant = image.copy()
+        variant.thumbnail((pixels, pixels))
+        variants.append((size, variant))
+
+    formats = [image_format] + (["webp"] if features.check('webp') else [])
+    filenames = []
+    for size, variant in variants:
+        for variant_format in formats:
+            filename = variant_filename(id, size, variant_format)
+            # ? Written next to the final name and moved in place, readers never see a partial file
+            temporary_path = os.path.join(
+                Config.UPLOAD_FOLDER, f".{filename}.tmp")
+            variant.save(temporary_path, optimize=True,
+                         quality=80, format=variant_format)
+            os.replace(temporary_path, os.path.join(
+                Config.UPLOAD_FOLDER, filename))
+            filenames.append(filename)
+
+    #! Drop the files of a previous image that was uploaded in another format, they would win over the new ones
+    for path in glob(f"{Config.UPLOAD_FOLDER}{id}.*"):
+        if os.path.basename(path) not in filenames:
+            os.remove(path)
+
+    image_paths.invalidate(id)
+    return filenames
+
+
+class ImagePathCache:
+    """Caches how the image of a lot is served, so a request needs neither a query nor a directory glob.
+
+    Entries are (expires_at, kind, value): ("redirect", url), ("files", {file name}) or ("fallback", None).
+    """
+
+    def __init__(self, ttl: int, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, id: str) -> tuple:
+        with self.lock:
+            entry = self.entries.get(id)
+            if entry is not None:
+                self.entries.move_to_end(id)
+        if entry is not None and entry[0] > monotonic():
+            return entry[1], entry[2]
+
+        lot = Inventory.query.with_entities(
+            Inventory.product_image).filter_by(id=id).first()
+        if lot is None:
+            return None, None
+
+        if lot.product_image and lot.product_image != "internal":
+            kind, value = "redirect", lot.product_image
+        else:
+            files = {os.path.basename(path)
+                     for path in glob(f"{Config.UPLOAD_FOLDER}{id}.*")}
+            kind, value = ("files", files) if lot.product_image and files else (
+                "fallback", None)
+
+        with self.lock:
+            self.entries[id] = (monotonic() + self.ttl, kind, value)
+            self.entries.move_to_end(id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return kind, value
+
+    def invalidate(self, *ids: str):
+        with self.lock:
+            for id in ids:
+                self.entries.pop(id, None)
+
+
+image_paths = ImagePathCache(Config.IMAGE_PATH_CACHE_TTL,
+                             Config.IMAGE_PATH_CACHE_SIZE)
+
+
+def pick_image_file(id: str, files: set, size: str, image_format: str = None) -> str:
+    original = next((name for name in sorted(files)
+                     if "." not in name[len(id) + 1:] and not name.endswith(".webp")), None)
+    image_format = image_format or (original.rsplit(".", 1)[1] if original else None)
+
+    # ? Images uploaded before the variants existed only have the original, serve that instead
+    for candidate in [variant_filename(id, size, image_format), variant_filename(id, "original", image_format), original]:
+        if candidate in files:
+            return candidate
+    return None
+
+
+def hidden_path(id: str, suffix: str) -> str:
+    # ? Dot files are skipped by the `<id>.*` globs, so unprocessed uploads are never served
+    return os.path.join(Config.UPLOAD_FOLDER, f".{id}.{suffix}")
+
+
+image_workers = ThreadPoolExecutor(max_workers=Config.IMAGE_WORKERS,
+                                   thread_name_prefix="image-processing")
+processing_locks = [Lock() for _ in range(64)]
+
+
+def store_upload(id: str, filedata: bytes):
+    """Stores a raw upload as-is and queues it for processing, the variants replace the current image once ready."""
+    # ? Unique temporary name, concurrent uploads of the same lot must not write into each other's file
+    descriptor, temporary_path = tempfile.mkstemp(
+        dir=Config.UPLOAD_FOLDER, prefix=f".{id}.", suffix=".tmp")
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(filedata)
+    os.replace(temporary_path, hidden_path(id, "upload"))
+
+    if os.path.exists(hidden_path(id, "failed")):
+        os.remove(hidden_path(id, "failed"))
+    image_workers.submit(process_upload, current_app._get_current_object(), id)
+
+
+def lot_exists(app, id: str) -> bool:
+    with app.app_context():
+        return db.session.query(Inventory.query.filter_by(id=id).exists()).scalar()
+
+
+def process_upload(app, id: str):
+    # ? Uploads of the same lot are processed one at a time, a job finding no upload left was superseded by an earlier one
+    with processing_locks[hash(id) % len(processing_locks)]:
+        try:
+            os.replace(hidden_path(id, "upload"), hidden_path(id, "work"))
+        except FileNotFoundError:
+            return
+
+        try:
+            if not lot_exists(app, id):
+                return
+
+            with Image.open(hidden_path(id, "work")) as image:
+                filenames = save_image_variants(
+                    id, image, IMAGE_FORMATS.get(image.format, "jpeg"))
+
+            #! The lot may have been deleted while its image was being processed
+            if not lot_exists(app, id):
+                for filename in filenames:
+                    os.remove(os.path.join(Config.UPLOAD_FOLDER, filename))
+                image_paths.invalidate(id)
+                return
+
+            if os.path.exists(hidden_path(id, "failed")):
+                os.remove(hidden_path(id, "failed"))
+        except Exception as e:
+            print(f"[IMAGES] Could not process the image of lot {id}: {e}")
+            open(hidden_path(id, "failed"), 'w').close()
+        finally:
+            if os.path.exists(hidden_path(id, "work")):
+                os.remove(hidden_path(id, "work"))
+
+
+def image_status(id: str, kind: str) -> str:
+    if os.path.exists(hidden_path(id, "upload")) or os.path.exists(hidden_path(id, "work")):
+        return "processing"
+    if os.path.exists(hidden_path(id, "failed")):
+        return "failed"
+    return "missing" if kind == "fallback" else "ready"
+
+
+def resume_image_processing(app):
+    """Queues the uploads left unprocessed by the previous run of the server."""
+    if not os.path.isdir(Config.UPLOAD_FOLDER):
+        return
+
+    ids = set()
+    with os.scandir(Config.UPLOAD_FOLDER) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") and entry.name.endswith((".upload", ".work")):
+                ids.add(entry.name[1:].rsplit(".", 1)[0])
+
+    for id in ids:
+        # ? A newer upload wins over the one that was being processed
+        if os.path.exists(hidden_path(id, "work")) and not os.path.exists(hidden_path(id, "upload")):
+            os.replace(hidden_path(id, "work"), hidden_path(id, "upload"))
+        elif os.path.exists(hidden_path(id, "work")):
+            os.remove(hidden_path(id, "work"))
+        image_workers.submit(process_upload, app, id)
+
+
+@event.listens_for(Session, "after_flush")
+def invalidate_image_paths(session, flush_context):
+    image_paths.invalidate(*[obj.id for obj in list(session.dirty) + list(session.deleted)
+                             if isinstance(obj, Inventory)])
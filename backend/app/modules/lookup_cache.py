@@ -0,0 +1,214 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.middleware.dbRouting import primary_reads
+from app.models.ActiveModifications import ActiveModifications
+from app.models.ArchivedInventory import ArchivedInventory
+from app.models.Inventory import Inventory
+from app.utils import barcode_stem, scanned_barcode_stems
+from config import Config
+
+
+class ProductLookupCache:
+    """LRU cache of the lot and price change rows behind a barcode stem, see `cached_product_lookup`.
+
+    Writes made through this process invalidate the affected entries right away, writes made by other processes
+    are picked up once the entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()    # (kind, stem) -> (expires_at, rows)
+        self.lot_keys = {}              # lot id -> keys of the entries containing the lot
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = Lock()
+
+    def get_many(self, kind: str, stems: list) -> tuple:
+        found = {}
+        with self.lock:
+            now = monotonic()
+            for stem in stems:
+                entry = self.entries.get((kind, stem))
+                if entry is not None and entry[0] > now:
+                    self.entries.move_to_end((kind, stem))
+                    found[stem] = entry[1]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return found, self.generation
+
+    def store(self, kind: str, rows_by_stem: dict, generation: int):
+        with self.lock:
+            # ? Rows read before an invalidation may already be stale
+            if generation != self.generation:
+                return
+
+            expires_at = monotonic() + self.ttl
+            for stem, rows in rows_by_stem.items():
+                self.entries[(kind, stem)] = (expires_at, rows)
+                self.entries.move_to_end((kind, stem))
+                for row in rows:
+                    self.lot_keys.setdefault(
+                        row.lot_id, set()).add((kind, stem))
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, stems: set = (), lot_ids: set = ()):
+        with self.lock:
+            self.generation += 1
+            keys = {(kind, stem) for stem in stems for kind in [
+                "lots", "changes"]}
+            for lot_id in lot_ids:
+                keys.update(self.lot_keys.pop(lot_id, set()))
+
+            for key in keys:
+                if self.entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.lot_keys.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations
+            }
+
+
+product_lookup_cache = ProductLookupCache(
+    Config.LOOKUP_CACHE_SIZE, Config.LOOKUP_CACHE_TTL)
+
+
+def query_lots_by_stems(stems: list) -> dict:
+    # ? Same outer join as query_product_by_barcode, so lots with several price changes are counted the same way
+    rows = Inventory.query.with_entities(Inventory.id.label('lot_id'), Inventory.product_id, Inventory.product_name, Inventory.product_barcode, Inventory.product_barcode_stem.label('stem'), Inventory.product_amount, Inventory.product_remain, Inventory.base_price, Inventory.inventory_date).filter(
+        Inventory.product_barcode_stem.in_(stems)).outerjoin(ActiveModifications, (Inventory.id == ActiveModifications.inventory_id)).all()
+
+    result = {stem: [] for stem in stems}
+    for row in rows:
+        result[row.stem].append(row)
+    return result
+
+
+def query_changes_by_stems(stems: list) -> dict:
+    rows = ActiveModifications.query.with_entities(ActiveModifications.inventory_id.label('lot_id'), ActiveModifications.modification_barcode.label('barcode'), ActiveModifications.modification_barcode_stem.label('stem'), ActiveModifications.approved_at, Inventory.product_barcode, ActiveModifications.new_price).join(
+        Inventory, (ActiveModifications.inventory_id == Inventory.id)).filter(ActiveModifications.modification_barcode_stem.in_(stems)).all()
+
+    result = {stem: [] for stem in stems}
+    for row in rows:
+        result[row.stem].append(row)
+    return result
+
+
+def lookup_rows(kind: str, stems: list, query) -> list:
+    found, generation = product_lookup_cache.get_many(kind, stems)
+    missing = [stem for stem in stems if stem not in found]
+    if len(missing) > 0:
+        # ? The cache is shared with the writers (e.g. sales ingestion), rows from a lagging replica must never end up in it
+        with primary_reads(db.session):
+            queried = query(missing)
+        product_lookup_cache.store(kind, queried, generation)
+        found.update(queried)
+
+    return [row for stem in stems for row in found[stem]]
+
+
+def cached_product_lookup(barcode: str) -> tuple:
+    """Cached equivalent of `query_product_by_barcode`, returns (lots, change) as lightweight rows.
+
+    Entries are kept per barcode stem, so every scan of a variable quantity product shares the same entry.
+    """
+    # ? Check to see if the given barcode is an active change barcode instead of a product barcode
+    changes = [row for row in lookup_rows("changes", scanned_barcode_stems(barcode), query_changes_by_stems)
+               if row.barcode == barcode or row.stem != row.barcode]
+    change = max(changes, key=lambda row: row.approved_at) if changes else None
+
+    if change:
+        barcode = change.product_barcode
+
+    lots = [row for row in lookup_rows("lots", scanned_barcode_stems(barcode), query_lots_by_stems)
+            if row.product_barcode == barcode or row.stem != row.product_barcode]
+
+    return (sorted(lots, key=lambda row: row.inventory_date, reverse=True), change)
+
+
+def attribute_values(obj, attribute: str) -> set:
+    history = inspect(obj).attrs[attribute].history
+    return set(history.added or ()) | set(history.unchanged or ()) | set(history.deleted or ())
+
+
+def invalidate_products(session, stems: set, lot_ids: set = ()):
+    product_lookup_cache.invalidate(stems, lot_ids)
+    # ? Invalidate again on commit, other requests may have cached the old rows in between
+    pending = session.info.setdefault("lookup_cache_pending", [set(), set()])
+    pending[0].update(stems)
+    pending[1].update(lot_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def invalidate_flushed_products(session, flush_context):
+    stems = set()
+    lot_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Inventory):
+            stems.update(attribute_values(obj, 'product_barcode_stem'))
+            lot_ids.add(obj.id)
+        elif isinstance(obj, ActiveModifications):
+            stems.update(attribute_values(obj, 'modification_barcode_stem'))
+            lot_ids.update(attribute_values(obj, 'inventory_id'))
+        elif isinstance(obj, ArchivedInventory):
+            stems.update(barcode_stem(barcode)
+                         for barcode in attribute_values(obj, 'product_barcode'))
+            lot_ids.add(obj.id)
+
+    if len(stems) > 0 or len(lot_ids) > 0:
+        invalidate_products(session, stems, lot_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_committed_products(session):
+    if session.info.pop("lookup_cache_clear", False):
+        product_lookup_cache.clear()
+
+    pending = session.info.pop("lookup_cache_pending", None)
+    if pending is not None:
+        product_lookup_cache.invalidate(*pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_pending_products(session):
+    session.info.pop("lookup_cache_clear", None)
+    session.info.pop("lookup_cache_pending", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def invalidate_bulk_statements(orm_execute_state):
+    # ? Bulk INSERT/UPDATE/DELETE statements bypass the flush, so the affected products are unknown
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.statement.table.name not in [Inventory.__tablename__, ActiveModifications.__tablename__, ArchivedInventory.__tablename__]:
+        return
+
+    # ? Statements that invalidate the products they touch themselves opt out with this execution option
+    if orm_execute_state.execution_options.get("lookup_cache_synced"):
+        return
+
+    product_lookup_cache.clear()
+    orm_execute_state.session.info["lookup_cache_clear"] = True
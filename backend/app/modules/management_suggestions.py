@@ -1,12 +1,17 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date, timedelta
 from decimal import Decimal
-from sqlalchemy import and_, func, text
+import pandas as pd
+from sqlalchemy import and_, func, insert, or_, text, union
 
 from app.extensions import db
+from app.models.ActiveModifications import ActiveModifications
 from app.models.Inventory import Inventory
 from app.models.SuggestedModifications import SuggestedModifications
-from app.models.PurchasedProducts import PurchasedProducts
+from app.models.TaskWatermarks import TaskWatermarks
 from app.models.Transactions import Transactions
+from app.modules.sales_rollup import sold_product_id, units_sold_by_product, unrolled_sales
 from config import Config
 
 
@@ -17,79 +22,169 @@ from config import Config
 # PRICE_DECREASE_MULTIPLIER = 0.2
 # RESTOCK_DAYS_THRESHOLD = 7
 
+MIN_LOTS_PER_WORKER = 100
+
+LotSnapshot = namedtuple('LotSnapshot', [
+                         'id', 'product_name', 'product_amount', 'product_remain', 'inventory_date', 'expiry_date', 'base_price'])
+
 
 def quantity_until_expiry_ratio(lot: Inventory) -> float:
     return Decimal((lot.expiry_date - date.today()).days / (lot.expiry_date - lot.inventory_date.date()).days) - (lot.product_remain / lot.product_amount)
 
 
 def product_demand_frequency(lot: Inventory) -> float:
-    transactions = Transactions.query.with_entities(PurchasedProducts.transaction_id, PurchasedProducts.product_name, PurchasedProducts.item_count, Transactions.date).join(
-        Transactions, Transactions.id == PurchasedProducts.transaction_id).filter(PurchasedProducts.product_name == lot.product_name).order_by(Transactions.date.asc()).all()
+    return product_demand_frequencies([lot])[lot.id]
+
+
+def product_demand_frequencies(lots: list) -> dict:
+    """Returns {lot id: average hours between sales} for all the given lots at once."""
+    if len(lots) == 0:
+        return {}
 
-    # print(f"DEBUG: Found {len(transactions)} transactions for {lot.product_name}!")
+    sales = units_sold_by_product({lot.product_id for lot in lots})
 
-    last_date = lot.inventory_date
-    delta_times = []    # in hours
-    total_qty = 0
-    for transaction in transactions:
-        difference = transaction.date - last_date
-        delta_times.append(
-            (difference.days * 86400 + difference.seconds) / 3600)
-        total_qty += transaction.item_count
-        last_date = transaction.date
+    frame = pd.DataFrame([(lot.id, lot.product_id, lot.inventory_date) for lot in lots], columns=[
+                         'id', 'product_id', 'inventory_date'])
+    frame = frame.merge(pd.DataFrame([(product_id, units, rows) for product_id, (units, rows) in sales.items()], columns=[
+                        'product_id', 'total_qty', 'sales_count']), on='product_id', how='left')
 
-    difference = datetime.now() - last_date
-    delta_times.append((difference.days * 86400 + difference.seconds) / 3600)
-    # print(f"DEBUG: delta_times: {delta_times}")
+    # ? The gaps between consecutive sales add up to the (whole) seconds elapsed since the lot's inventory date,
+    # ? so only the total quantity sold of each product is needed
+    elapsed_hours = ((datetime.now() - frame['inventory_date']).dt.total_seconds() // 1) / 3600
+    total_qty = frame['total_qty'].astype(float)
+    demand = (elapsed_hours / total_qty).where((frame['sales_count'] > 0) & (total_qty != 0), -1)
 
-    return sum(delta_times) / float(total_qty) if len(delta_times) > 1 else -1
+    return dict(zip(frame['id'], demand.tolist()))
 
 
-def get_suggestion(lot: Inventory) -> SuggestedModifications:
+def evaluate_lot(lot: Inventory, avg_delta: float, config_data: dict) -> dict:
+    # ? Pure suggestion math, `lot` can be an Inventory row or a LotSnapshot so it can run in a worker process
     days_until_expiry = (lot.expiry_date - date.today()).days
 
-    result = SuggestedModifications(
-        inventory_id=lot.id,
-        type=None,
-        new_price=0,
-        out_of_stock_prediction=None
-    )
+    result = {
+        "inventory_id": lot.id,
+        "type": None,
+        "new_price": 0,
+        "out_of_stock_prediction": None
+    }
 
     if days_until_expiry <= 0:
-        result.type = "Dispose"
+        result["type"] = "Dispose"
     else:
         qty_exp = quantity_until_expiry_ratio(lot)
-        avg_delta = product_demand_frequency(lot)
         time_until_oos = timedelta(
             days=((float(lot.product_remain) * avg_delta) / 24))
-        result.out_of_stock_prediction = date.today() + time_until_oos
+        result["out_of_stock_prediction"] = date.today() + time_until_oos
 
-        if time_until_oos.days <= Config.CONFIG_DATA["threshold_restock_days"] and time_until_oos.days > -1:
-            result.type = "Restock"
+        if time_until_oos.days <= config_data["threshold_restock_days"] and time_until_oos.days > -1:
+            result["type"] = "Restock"
         else:
-            if qty_exp >= Config.CONFIG_DATA["threshold_price_increase"]:
-                result.type = "PriceIncrease"
-                result.new_price = lot.base_price + \
+            if qty_exp >= config_data["threshold_price_increase"]:
+                result["type"] = "PriceIncrease"
+                result["new_price"] = lot.base_price + \
                     lot.base_price * \
                     (qty_exp *
-                     Decimal(Config.CONFIG_DATA["multiplier_price_increase"]))
-            elif qty_exp <= Config.CONFIG_DATA["threshold_price_decrease"]:
-                result.type = "PriceDecrease"
-                result.new_price = lot.base_price + \
+                     Decimal(config_data["multiplier_price_increase"]))
+            elif qty_exp <= config_data["threshold_price_decrease"]:
+                result["type"] = "PriceDecrease"
+                result["new_price"] = lot.base_price + \
                     lot.base_price * \
                     (qty_exp *
-                     Decimal(Config.CONFIG_DATA["multiplier_price_decrease"]))
+                     Decimal(config_data["multiplier_price_decrease"]))
 
     return result
 
 
-def generate_suggestions():
-    lots = Inventory.query.filter(and_(Inventory.modifiable == True, and_(date.today() >= (func.date_add(Inventory.inventory_date, text("INTERVAL (%s/2) DAY" % func.datediff(
-        Inventory.expiry_date, Inventory.inventory_date)))), Inventory.id.not_in(SuggestedModifications.query.with_entities(SuggestedModifications.inventory_id)))))
+def get_suggestion(lot: Inventory, avg_delta: float = None) -> SuggestedModifications:
+    if avg_delta is None and lot.expiry_date > date.today():
+        avg_delta = product_demand_frequency(lot)
+
+    return SuggestedModifications(**evaluate_lot(lot, avg_delta, Config.CONFIG_DATA))
 
-    SuggestedModifications.query.delete()
 
+def evaluate_chunk(chunk: list, config_data: dict) -> list:
+    return [evaluate_lot(lot, avg_delta, config_data) for lot, avg_delta in chunk]
+
+
+def product_grouped_chunks(lots: list, demand: dict, chunk_count: int) -> list:
+    # ? Keep all lots of a product in the same chunk and hand the biggest products out first to balance the chunks
+    products = {}
     for lot in lots:
-        db.session.add(get_suggestion(lot))
+        products.setdefault(lot.product_name, []).append(
+            (LotSnapshot(lot.id, lot.product_name, lot.product_amount, lot.product_remain, lot.inventory_date, lot.expiry_date, lot.base_price), demand[lot.id]))
+
+    chunks = [[] for _ in range(chunk_count)]
+    for product_lots in sorted(products.values(), key=len, reverse=True):
+        min(chunks, key=len).extend(product_lots)
+
+    return [chunk for chunk in chunks if len(chunk) > 0]
+
+
+def evaluate_lots(lots: list) -> list:
+    demand = product_demand_frequencies(lots)
+    workers = min(Config.CONFIG_DATA.get("suggestion_workers", 1),
+                  len(lots) // MIN_LOTS_PER_WORKER)
+
+    if workers <= 1:
+        return [evaluate_lot(lot, demand[lot.id], Config.CONFIG_DATA) for lot in lots]
+
+    chunks = product_grouped_chunks(lots, demand, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(evaluate_chunk, chunks, [
+                           Config.CONFIG_DATA] * len(chunks))
+        return [suggestion for chunk in results for suggestion in chunk]
+
+
+def half_life_date():
+    return func.date_add(Inventory.inventory_date, text("INTERVAL (%s/2) DAY" % func.datediff(
+        Inventory.expiry_date, Inventory.inventory_date)))
+
+
+def changed_lot_ids(watermark: TaskWatermarks):
+    # ? Lots edited, repriced or sold since the last run, plus lots that reached their half-life or expired since then
+    last_run_date = watermark.last_run_at.date()
+    return union(
+        Inventory.query.with_entities(Inventory.id).filter(
+            Inventory.modified_at >= watermark.last_run_at).statement,
+        ActiveModifications.query.with_entities(ActiveModifications.inventory_id).filter(
+            ActiveModifications.approved_at >= watermark.last_run_at).statement,
+        Inventory.query.with_entities(Inventory.id).filter(Inventory.product_id.in_(unrolled_sales(
+            watermark.last_transaction_id or 0).with_entities(sold_product_id))).statement,
+        Inventory.query.with_entities(Inventory.id).filter(or_(and_(half_life_date() > last_run_date, half_life_date() <= date.today()), and_(
+            Inventory.expiry_date > last_run_date, Inventory.expiry_date <= date.today()))).statement
+    )
+
+
+def generate_suggestions(incremental: bool = None):
+    if incremental is None:
+        incremental = Config.CONFIG_DATA.get("incremental_suggestions", True)
+
+    run_started_at = datetime.now()
+    last_transaction_id = Transactions.query.with_entities(
+        func.max(Transactions.id)).scalar()
+    watermark = db.session.get(TaskWatermarks, "auto_suggestions")
+
+    lots = Inventory.query.filter(
+        and_(Inventory.modifiable == True, date.today() >= half_life_date()))
+
+    if incremental and watermark is not None:
+        changed_ids = changed_lot_ids(watermark).subquery()
+
+        #! Drop the stale suggestions of changed lots and those left behind by deleted or archived lots
+        SuggestedModifications.query.filter(or_(SuggestedModifications.inventory_id.in_(changed_ids.select()), SuggestedModifications.inventory_id.is_(
+            None), SuggestedModifications.inventory_id.not_in(Inventory.query.with_entities(Inventory.id)))).delete(synchronize_session=False)
+        lots = lots.filter(Inventory.id.in_(changed_ids.select()))
+    else:
+        SuggestedModifications.query.delete()
+
+    suggestions = evaluate_lots(lots.all())
+    if len(suggestions) > 0:
+        db.session.execute(insert(SuggestedModifications), suggestions)
+
+    if watermark is None:
+        watermark = TaskWatermarks(task="auto_suggestions")
+        db.session.add(watermark)
+    watermark.last_run_at = run_started_at
+    watermark.last_transaction_id = last_transaction_id
 
     db.session.commit()
@@ -0,0 +1,51 @@
+from sqlalchemy import event, inspect, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.ArchivedInventory import ArchivedInventory
+from app.models.Inventory import Inventory
+from app.models.Products import Products
+from app.models.PurchasedProducts import PurchasedProducts
+
+
+def normalized_name(name: str) -> str:
+    # ? MySQL's default collation compares names case-insensitively and ignores trailing spaces
+    return name.lower().rstrip()
+
+
+def product_ids(session, products: dict) -> dict:
+    """Returns {product name: catalog id} for {product name: barcode}, adding the products missing from the catalog."""
+    names = [name for name in products if name is not None]
+    if len(names) == 0:
+        return {}
+
+    found = dict(session.execute(select(Products.name, Products.id).where(
+        Products.name.in_(names))).all())
+    missing = [name for name in names if name not in found]
+    if len(missing) > 0:
+        # ? Ignore names added by a concurrent request in the meantime, they are read back below
+        session.execute(insert(Products.__table__).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite"),
+                        [{"name": name, "barcode": products[name]} for name in missing])
+        found.update(session.execute(select(Products.name, Products.id).where(
+            Products.name.in_(missing))).all())
+
+    normalized = {normalized_name(name): product_id for name, product_id in found.items()}
+    return {name: found.get(name, normalized.get(normalized_name(name))) for name in names}
+
+
+@event.listens_for(Session, "before_flush")
+def assign_product_ids(session, flush_context, instances):
+    pending = [obj for obj in list(session.new) + list(session.dirty)
+               if isinstance(obj, (Inventory, ArchivedInventory, PurchasedProducts)) and obj.product_name is not None
+               and (obj.product_id is None or inspect(obj).attrs.product_name.history.has_changes())]
+    if len(pending) == 0:
+        return
+
+    products = {}
+    for obj in pending:
+        if products.get(obj.product_name) is None:
+            products[obj.product_name] = getattr(obj, 'product_barcode', None)
+
+    with session.no_autoflush:
+        ids = product_ids(session, products)
+    for obj in pending:
+        obj.product_id = ids.get(obj.product_name)
@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+from sqlalchemy import func
+
+from app.models.DailyProductSales import DailyProductSales
+from app.models.Inventory import Inventory
+from app.modules.chart_cache import chart_cache
+from app.modules.chart_renderers import get_chart_renderer
+from app.modules.sales_statistics import daily_sales_report, monthly_sales_report, sales_distribution
+from config import Config
+
+
+def render_sales_distribution(product_name: str, distr: dict) -> bytes:
+    return get_chart_renderer().sales_distribution(product_name, distr)
+
+
+def render_monthly_sales(product_name: str, report: dict) -> bytes:
+    return get_chart_renderer().line_chart(f"Monthly sales – {product_name}", report)
+
+
+def render_daily_sales(product_name: str, report: dict) -> bytes:
+    return get_chart_renderer().line_chart(f"Daily sales – {product_name}", report)
+
+
+# ? chart name -> (aggregation, renderer)
+CHARTS = {
+    "sales-distribution": (sales_distribution, render_sales_distribution),
+    "monthly-sales": (lambda lot: monthly_sales_report(lot.product_id), render_monthly_sales),
+    "daily-sales": (lambda lot: daily_sales_report(lot.product_id), render_daily_sales)
+}
+
+
+def chart_data(chart: str, lot: Inventory) -> tuple:
+    """Returns (cache key, aggregated data) of a product's chart, the key doubles as the chart's ETag."""
+    data = CHARTS[chart][0](lot)
+    return chart_cache.key(f"{chart}.{get_chart_renderer().name}", lot.product_name, data), data
+
+
+def chart_series(chart: str, lot: Inventory) -> tuple:
+    """Returns (ETag, compact JSON payload) of a product's chart data, for clients that draw the chart themselves."""
+    data = CHARTS[chart][0](lot)
+    if chart == "sales-distribution":
+        series = {name: int(value) if name == "sales_count" else float(value)
+                  for name, value in data.items()}
+    else:
+        series = {"labels": list(data.keys()), "values": [
+            float(value) for value in data.values()]}
+
+    return chart_cache.key(f"{chart}.json", lot.product_name, data), {"product_name": lot.product_name, **series}
+
+
+def chart_image(chart: str, lot: Inventory, key: str, data) -> bytes:
+    image = chart_cache.get(key)
+    if image is None:
+        image = CHARTS[chart][1](lot.product_name, data)
+        chart_cache.put(key, image)
+    return image
+
+
+def prerender_charts():
+    # ? Warm the chart cache with the best selling products of the last 30 days
+    top_products = DailyProductSales.query.with_entities(DailyProductSales.product_id).filter(DailyProductSales.day >= date.today() - timedelta(days=30)).group_by(
+        DailyProductSales.product_id).order_by(func.sum(DailyProductSales.units).desc()).limit(Config.CONFIG_DATA.get("chart_prerender_top_n", 20)).all()
+
+    for (product_id,) in top_products:
+        lot = Inventory.query.filter_by(product_id=product_id).order_by(
+            Inventory.inventory_date.desc()).first()
+        if lot is None:
+            continue
+
+        for chart in CHARTS:
+            chart_image(chart, lot, *chart_data(chart, lot))
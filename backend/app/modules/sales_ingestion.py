@@ -0,0 +1,189 @@
+from datetime import datetime
+from decimal import Decimal
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models.PurchasedProducts import PurchasedProducts
+from app.models.Transactions import Transactions
+from app.modules.lookup_cache import cached_product_lookup
+from app.modules.stock import decrement_stock_many
+from app.utils import get_quantity_from_barcode
+from config import Config
+
+
+class IngestionError(Exception):
+    pass
+
+
+def resolve_item(item: dict) -> tuple:
+    """Turns a scanned checkout line into (PurchasedProducts row without transaction id, sold product barcode)."""
+    if not isinstance(item, dict) or not isinstance(item.get('barcode'), str):
+        raise IngestionError("Invalid item")
+
+    barcode = item['barcode']
+    lots, change = cached_product_lookup(barcode)
+    if not lots:
+        raise IngestionError(f"Product with barcode '{barcode}' not found")
+
+    # ? Same pricing as the short product lookup, variable quantity barcodes carry the quantity themselves
+    weighted = barcode not in [lots[0].product_barcode,
+                               change.barcode if change else None]
+    item_count = get_quantity_from_barcode(barcode) if weighted else Decimal(
+        str(item.get('quantity', 1)))
+    unit_price = change.new_price if change else lots[0].base_price
+
+    payed_price = Decimal(str(item['payed_price'])) if 'payed_price' in item else round(
+        unit_price * item_count, 2)
+
+    if item_count <= 0 or payed_price < 0:
+        raise IngestionError(f"Invalid quantity or price for barcode '{barcode}'")
+
+    return {
+        "product_id": lots[0].product_id,
+        "product_name": lots[0].product_name,
+        "item_count": item_count,
+        "payed_price": payed_price
+    }, lots[0].product_barcode
+
+
+def resolve_transaction(transaction: dict) -> tuple:
+    """Returns (Transactions values, [(PurchasedProducts row, sold product barcode)]) of one checkout."""
+    if not isinstance(transaction, dict) or not isinstance(transaction.get('items'), list) or len(transaction['items']) == 0:
+        raise IngestionError("Expected a non-empty list of items")
+
+    try:
+        date = datetime.strptime(transaction['date'], "%Y.%m.%d %H:%M:%S") if 'date' in transaction else datetime.now()
+    except (TypeError, ValueError):
+        raise IngestionError("Invalid date")
+
+    try:
+        items = [resolve_item(item) for item in transaction['items']]
+        total_price = Decimal(str(transaction['total_price'])) if 'total_price' in transaction else sum(
+            item['payed_price'] for item, _ in items)
+    except ArithmeticError:
+        raise IngestionError("Invalid number")
+
+    return {"date": date, "total_price": total_price}, items
+
+
+class PendingWrite:
+    def __init__(self, transactions: list):
+        self.transactions = transactions
+        self.transaction_ids = None
+        self.error = None
+        self.done = Event()
+        self.state = "queued"   # queued -> writing, or queued -> cancelled
+        self.lock = Lock()
+
+    def claim(self) -> bool:
+        with self.lock:
+            if self.state != "queued":
+                return False
+            self.state = "writing"
+            return True
+
+    def cancel(self) -> bool:
+        with self.lock:
+            if self.state != "queued":
+                return False
+            self.state = "cancelled"
+            return True
+
+
+class SalesIngestor:
+    """Group commit for checkout transactions.
+
+    Request threads hand their resolved transactions to a single writer thread and wait. The writer collects
+    everything submitted within INGEST_COMMIT_WAIT (up to INGEST_MAX_BATCH writes) and stores it with one commit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.queue = Queue()
+        self.writer_thread = None
+        self.lock = Lock()
+
+    def submit(self, transactions: list) -> list:
+        pending = PendingWrite(transactions)
+        self.queue.put(pending)
+        self.ensure_writer()
+
+        if not pending.done.wait(Config.INGEST_TIMEOUT):
+            #! Only give up on writes the writer hasn't started, a 503 must mean that nothing was stored
+            if pending.cancel():
+                raise TimeoutError("Timed out waiting for the transactions to be stored")
+            pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.transaction_ids
+
+    def ensure_writer(self):
+        with self.lock:
+            if self.writer_thread is None or not self.writer_thread.is_alive():
+                self.writer_thread = Thread(
+                    target=self.run_writer, daemon=True)
+                self.writer_thread.start()
+
+    def next_batch(self) -> list:
+        batch = [self.queue.get()]
+        deadline = monotonic() + Config.INGEST_COMMIT_WAIT
+        while len(batch) < Config.INGEST_MAX_BATCH:
+            try:
+                batch.append(self.queue.get(
+                    timeout=max(deadline - monotonic(), 0)))
+            except Empty:
+                break
+        return batch
+
+    def run_writer(self):
+        with self.app.app_context():
+            while True:
+                batch = [pending for pending in self.next_batch()
+                         if pending.claim()]
+                if len(batch) == 0:
+                    continue
+
+                try:
+                    self.write(batch)
+                except Exception:
+                    db.session.rollback()
+                    # ? Retry the writes one by one so a single bad request does not fail the whole group
+                    for pending in batch:
+                        try:
+                            self.write([pending])
+                        except Exception as ex:
+                            db.session.rollback()
+                            pending.error = ex
+                finally:
+                    for pending in batch:
+                        pending.done.set()
+
+    def write(self, batch: list):
+        transactions = [[Transactions(**values) for values, _ in pending.transactions]
+                        for pending in batch]
+        db.session.add_all(
+            [transaction for group in transactions for transaction in group])
+        db.session.flush()
+
+        purchased_products = [{**item, "transaction_id": transaction.id}
+                              for pending, group in zip(batch, transactions)
+                              for (_, items), transaction in zip(pending.transactions, group)
+                              for item, _ in items]
+        db.session.execute(insert(PurchasedProducts), purchased_products)
+
+        #! Take the sold quantities out of the stock in the same transaction
+        decrement_stock_many([(product_barcode, item['item_count'])
+                              for pending in batch
+                              for _, items in pending.transactions
+                              for item, product_barcode in items])
+
+        # ? Read before the commit expires the instances, afterwards every id would be a refresh query
+        transaction_ids = [[transaction.id for transaction in group]
+                           for group in transactions]
+        db.session.commit()
+
+        for pending, ids in zip(batch, transaction_ids):
+            pending.transaction_ids = ids
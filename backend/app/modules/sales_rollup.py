@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, bindparam, case, func, tuple_, update
+
+from app.extensions import db
+from app.models.ArchivedInventory import ArchivedInventory
+from app.models.DailyProductSales import DailyProductSales
+from app.models.Inventory import Inventory
+from app.models.Products import Products
+from app.models.PurchasedProducts import PurchasedProducts
+from app.models.TaskWatermarks import TaskWatermarks
+from app.models.Transactions import Transactions
+from app.modules.products import product_ids as catalog_product_ids
+
+
+ROLLUP_BATCH_SIZE = 5000            # transactions per batch
+ROLLUP_LAG = timedelta(minutes=5)   # leave recent transactions to the next run, lower ids may still be uncommitted
+
+
+def rollup_watermark() -> int:
+    # ? Id of the last transaction included in DailyProductSales, newer ones are read from PurchasedProducts
+    watermark = db.session.get(TaskWatermarks, "sales_rollup")
+    return watermark.last_transaction_id if watermark and watermark.last_transaction_id else 0
+
+
+# ? Rows written straight to the database (e.g. by the POS) have no product id until the rollup assigns one,
+# ? until then they are matched to the catalog by name. Use with `unrolled_sales`, which joins Products
+sold_product_id = func.coalesce(PurchasedProducts.product_id, Products.id)
+
+
+def unrolled_sales(last_transaction_id: int):
+    return PurchasedProducts.query.join(Transactions, (PurchasedProducts.transaction_id == Transactions.id)).outerjoin(Products, and_(
+        PurchasedProducts.product_id.is_(None), Products.name == PurchasedProducts.product_name)).filter(Transactions.id > last_transaction_id)
+
+
+def assign_missing_product_ids():
+    names = [name for name, in PurchasedProducts.query.with_entities(PurchasedProducts.product_name).filter(
+        PurchasedProducts.product_id.is_(None), PurchasedProducts.product_name.isnot(None)).distinct()]
+    if len(names) == 0:
+        return
+
+    ids = [{"name": name, "catalog_id": product_id} for name, product_id in catalog_product_ids(
+        db.session, {name: None for name in names}).items() if product_id is not None]
+    if len(ids) > 0:
+        table = PurchasedProducts.__table__
+        db.session.execute(update(table).where(and_(table.c.product_id.is_(None), table.c.product_name == bindparam('name'))).values(
+            product_id=bindparam('catalog_id')), ids)
+
+
+def units_sold_by_product(product_ids: set) -> dict:
+    """Returns {product id: (units sold, sale rows)} from the rollup plus the sales that are not rolled up yet."""
+    last_transaction_id = rollup_watermark()
+    totals = {}
+
+    rolled = DailyProductSales.query.with_entities(DailyProductSales.product_id, func.sum(DailyProductSales.units), func.count()).filter(
+        DailyProductSales.product_id.in_(product_ids)).group_by(DailyProductSales.product_id).all()
+    recent = unrolled_sales(last_transaction_id).with_entities(sold_product_id, func.sum(PurchasedProducts.item_count), func.count(PurchasedProducts.id)).filter(
+        sold_product_id.in_(product_ids)).group_by(sold_product_id).all()
+
+    for product_id, units, rows in rolled + recent:
+        previous = totals.get(product_id, (0, 0))
+        totals[product_id] = (previous[0] + units, previous[1] + rows)
+
+    return totals
+
+
+def update_sales_rollup():
+    watermark = db.session.get(TaskWatermarks, "sales_rollup")
+    if watermark is None:
+        watermark = TaskWatermarks(task="sales_rollup", last_transaction_id=0)
+        db.session.add(watermark)
+
+    last_transaction_id = watermark.last_transaction_id or 0
+    assign_missing_product_ids()
+    upper_transaction_id = Transactions.query.with_entities(func.max(Transactions.id)).filter(
+        Transactions.date <= datetime.now() - ROLLUP_LAG).scalar() or 0
+
+    # ? Sales are classified against the newest lot's base price, like the sales distribution chart. Products sold out
+    # ? and archived since the sale fall back to their newest archived lot
+    base_price = func.coalesce(
+        Inventory.query.with_entities(Inventory.base_price).filter(Inventory.product_id == sold_product_id).order_by(
+            Inventory.inventory_date.desc()).limit(1).scalar_subquery(),
+        ArchivedInventory.query.with_entities(ArchivedInventory.base_price).filter(ArchivedInventory.product_id == sold_product_id).order_by(
+            ArchivedInventory.inventory_date.desc()).limit(1).scalar_subquery())
+    paid_at_base_price = PurchasedProducts.item_count * base_price
+    day = func.date(Transactions.date, type_=db.Date)
+
+    while last_transaction_id < upper_transaction_id:
+        batch_end = min(last_transaction_id +
+                        ROLLUP_BATCH_SIZE, upper_transaction_id)
+
+        sales = unrolled_sales(last_transaction_id).with_entities(
+            sold_product_id,
+            day,
+            func.sum(PurchasedProducts.item_count),
+            func.sum(PurchasedProducts.payed_price),
+            func.sum(case((PurchasedProducts.payed_price < paid_at_base_price, PurchasedProducts.item_count), else_=0)),
+            func.sum(case((PurchasedProducts.payed_price > paid_at_base_price, PurchasedProducts.item_count), else_=0))
+        ).filter(Transactions.id <= batch_end, sold_product_id.isnot(None)).group_by(sold_product_id, day).all()
+
+        # ? Keyed on (product id, day), the name is the catalog's so it stays unique with the table's primary key
+        keys = [(sale[0], sale[1]) for sale in sales]
+        existing = {}
+        names = {}
+        if len(keys) > 0:
+            for row in DailyProductSales.query.filter(tuple_(DailyProductSales.product_id, DailyProductSales.day).in_(keys)):
+                existing.setdefault((row.product_id, row.day), row)
+            names = dict(Products.query.with_entities(Products.id, Products.name).filter(
+                Products.id.in_({key[0] for key in keys})).all())
+
+        for product_id, sale_day, units, revenue, discounted_units, profit_units in sales:
+            row = existing.get((product_id, sale_day))
+            if row is None:
+                row = DailyProductSales(product_name=names[product_id], product_id=product_id, day=sale_day,
+                                        units=0, revenue=0, discounted_units=0, profit_units=0)
+                db.session.add(row)
+                existing[(product_id, sale_day)] = row
+            row.units += units
+            row.revenue += revenue
+            row.discounted_units += discounted_units
+            row.profit_units += profit_units
+
+        # ? The batch and the watermark are committed together, so an interrupted run resumes where it stopped
+        watermark.last_transaction_id = batch_end
+        watermark.last_run_at = datetime.now()
+        db.session.commit()
+        last_transaction_id = batch_end
+
+    watermark.last_run_at = datetime.now()
+    db.session.commit()
@@ -0,0 +1,89 @@
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import and_, case, func
+
+from app.models.PurchasedProducts import PurchasedProducts
+from app.models.Transactions import Transactions
+from app.models.ArchivedInventory import ArchivedInventory
+from app.models.DailyProductSales import DailyProductSales
+from app.modules.sales_rollup import rollup_watermark, sold_product_id, unrolled_sales
+
+
+def sales_distribution(lot) -> dict:
+    # ? Rolled up days are summed from DailyProductSales, the sales after the rollup's watermark are classified here
+    last_transaction_id = rollup_watermark()
+    disposed = ArchivedInventory.query.with_entities(func.coalesce(func.sum(ArchivedInventory.product_remain), 0)).filter(
+        ArchivedInventory.product_id == lot.product_id).scalar_subquery()
+
+    rolled = DailyProductSales.query.with_entities(
+        func.count(),
+        func.coalesce(func.sum(DailyProductSales.units - DailyProductSales.discounted_units - DailyProductSales.profit_units), 0),
+        func.coalesce(func.sum(DailyProductSales.discounted_units), 0),
+        func.coalesce(func.sum(DailyProductSales.profit_units), 0),
+        disposed
+    ).filter(DailyProductSales.product_id == lot.product_id).one()
+
+    paid_at_base_price = PurchasedProducts.item_count * lot.base_price
+    recent = unrolled_sales(last_transaction_id).with_entities(
+        func.count(PurchasedProducts.id),
+        func.coalesce(func.sum(case((PurchasedProducts.payed_price == paid_at_base_price, PurchasedProducts.item_count), else_=0)), 0),
+        func.coalesce(func.sum(case((PurchasedProducts.payed_price < paid_at_base_price, PurchasedProducts.item_count), else_=0)), 0),
+        func.coalesce(func.sum(case((PurchasedProducts.payed_price > paid_at_base_price, PurchasedProducts.item_count), else_=0)), 0)
+    ).filter(sold_product_id == lot.product_id).one()
+
+    return {
+        "sales_count": rolled[0] + recent[0],
+        "sold_base_price": rolled[1] + recent[1],
+        "sold_discount": rolled[2] + recent[2],
+        "sold_profit": rolled[3] + recent[3],
+        "disposed": rolled[4]
+    }
+
+
+def sales_by_period(product_id: int, period_format: str, start: date, end: date) -> dict:
+    last_transaction_id = rollup_watermark()
+
+    period = func.date_format(DailyProductSales.day, period_format)
+    rolled = DailyProductSales.query.with_entities(period, func.sum(DailyProductSales.units)).filter(and_(
+        DailyProductSales.product_id == product_id, DailyProductSales.day >= start, DailyProductSales.day < end)).group_by(period).all()
+
+    period = func.date_format(Transactions.date, period_format)
+    recent = unrolled_sales(last_transaction_id).with_entities(period, func.sum(PurchasedProducts.item_count)).filter(and_(
+        sold_product_id == product_id, Transactions.date >= start, Transactions.date < end)).group_by(period).all()
+
+    sales = {}
+    for sale in rolled + recent:
+        sales[sale[0]] = sales.get(sale[0], 0) + sale[1]
+    return sales
+
+
+def monthly_sales_report(product_id: int) -> dict:
+    start_date = (date.today() - relativedelta(years=1)).replace(day=1)
+    sales = sales_by_period(product_id, "%Y-%m", start_date,
+                            date.today().replace(day=1) + relativedelta(months=1))
+
+    # ? Fill the months without sales
+    report = {}
+    current_date = start_date
+    while current_date < date.today():
+        report[current_date.strftime("%Y-%m")] = sales.get(
+            current_date.strftime("%Y-%m"), 0)
+        current_date += relativedelta(months=1)
+
+    return report
+
+
+def daily_sales_report(product_id: int) -> dict:
+    start_date = date.today() - relativedelta(months=1)
+    sales = sales_by_period(product_id, "%Y-%m-%d",
+                            start_date, date.today())
+
+    # ? Fill the days without sales
+    report = {}
+    current_date = start_date
+    while current_date < date.today():
+        report[current_date.strftime("%Y-%m-%d")] = sales.get(
+            current_date.strftime("%Y-%m-%d"), 0)
+        current_date += relativedelta(days=1)
+
+    return report
@@ -6,11 +6,18 @@ from threading import Thread
 
 from config import Config
 from app.modules.management_suggestions import generate_suggestions
+from app.modules.inventory_archival import auto_archive
 from app.modules.inventory_cleanup import remove_empty_lots
+from app.modules.sales_rollup import update_sales_rollup
+from app.modules.sales_charts import prerender_charts
 
 TASKS = {
     "auto_suggestions": generate_suggestions,
-    "auto_cleanup": remove_empty_lots
+    "full_suggestions": lambda: generate_suggestions(incremental=False),
+    "auto_cleanup": remove_empty_lots,
+    "auto_archive": auto_archive,
+    "sales_rollup": update_sales_rollup,
+    "chart_prerender": prerender_charts
 }
 
 
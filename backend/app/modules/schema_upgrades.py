@@ -0,0 +1,166 @@
+from datetime import datetime
+from sqlalchemy import and_, case, func, insert, inspect, null, select, text, union_all, update
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models.ActiveModifications import ActiveModifications
+from app.models.ArchivedInventory import ArchivedInventory
+from app.models.DailyProductSales import DailyProductSales
+from app.models.Inventory import Inventory
+from app.models.Products import Products
+from app.models.PurchasedProducts import PurchasedProducts
+from app.models.SchemaVersion import SchemaVersion
+from app.models.Transactions import Transactions
+from app.models.Users import Users
+from app.modules.search_index import create_fulltext_index
+
+
+def add_column_if_missing(connection, column):
+    if column.name in [existing['name'] for existing in inspect(connection).get_columns(column.table.name)]:
+        return False
+
+    connection.execute(text(
+        f"ALTER TABLE {column.table.name} ADD COLUMN {column.name} {column.type.compile(dialect=connection.dialect)}"))
+    return True
+
+
+def create_index_if_missing(connection, index):
+    if index.name in [existing['name'] for existing in inspect(connection).get_indexes(index.table.name)]:
+        return False
+
+    index.create(bind=connection)
+    return True
+
+
+def sql_barcode_stem(barcode_column):
+    # ? Same rule as app.utils.barcode_stem, evaluated by the database
+    return case((and_(barcode_column.like("%00000_"), func.length(barcode_column) > 6), func.substr(barcode_column, 1, func.length(barcode_column) - 6)), else_=barcode_column)
+
+
+def add_barcode_stems(connection):
+    for model, barcode, stem in [(Inventory, Inventory.product_barcode, Inventory.product_barcode_stem), (ActiveModifications, ActiveModifications.modification_barcode, ActiveModifications.modification_barcode_stem)]:
+        stem_column = stem.property.columns[0]
+        add_column_if_missing(connection, stem_column)
+        for index in model.__table__.indexes:
+            if list(index.columns) == [stem_column]:
+                create_index_if_missing(connection, index)
+
+        connection.execute(update(model.__table__).where(and_(stem.is_(None), barcode.is_not(None))).values(
+            {stem.key: sql_barcode_stem(barcode)}))
+
+
+def add_archive_indexes(connection):
+    for index in ArchivedInventory.__table__.indexes:
+        create_index_if_missing(connection, index)
+
+
+def existing_columns(connection, table) -> set:
+    return {column['name'] for column in inspect(connection).get_columns(table.name)}
+
+
+def add_query_indexes(connection):
+    # ? Indexes matching the filters, joins and orderings of the routes and modules, see the models' __table_args__
+    for model in [Inventory, ActiveModifications, PurchasedProducts, Transactions, Users]:
+        columns = existing_columns(connection, model.__table__)
+        for index in model.__table__.indexes:
+            # ? Indexes on columns added by later migrations are created by those migrations
+            if {column.name for column in index.columns} <= columns:
+                create_index_if_missing(connection, index)
+
+
+def add_foreign_key_if_missing(connection, column):
+    # ? SQLite can't add constraints to existing tables, the column still works as a plain reference there
+    if connection.dialect.name != "mysql":
+        return False
+
+    foreign_key = next(iter(column.foreign_keys))
+    if any(existing['constrained_columns'] == [column.name] for existing in inspect(connection).get_foreign_keys(column.table.name)):
+        return False
+
+    connection.execute(text(
+        f"ALTER TABLE {column.table.name} ADD CONSTRAINT fk_{column.table.name}_{column.name} FOREIGN KEY ({column.name}) "
+        f"REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name}) ON DELETE {foreign_key.ondelete}"))
+    return True
+
+
+def add_product_catalog(connection):
+    Products.__table__.create(bind=connection, checkfirst=True)
+
+    referencing_models = [Inventory, ArchivedInventory,
+                          PurchasedProducts, DailyProductSales]
+    for model in referencing_models:
+        product_id = model.__table__.c.product_id
+        add_column_if_missing(connection, product_id)
+        add_foreign_key_if_missing(connection, product_id)
+        for index in model.__table__.indexes:
+            if product_id.name in index.columns:
+                create_index_if_missing(connection, index)
+
+    #! Fill the catalog with every product name in use, keeping a barcode of the product where one is known
+    names = union_all(
+        select(Inventory.product_name.label('name'),
+               Inventory.product_barcode.label('barcode')),
+        select(ArchivedInventory.product_name, ArchivedInventory.product_barcode),
+        select(PurchasedProducts.product_name, null()),
+        select(DailyProductSales.product_name, null())
+    ).subquery()
+    connection.execute(insert(Products.__table__).from_select(['name', 'barcode'], select(names.c.name, func.max(names.c.barcode)).where(and_(
+        names.c.name.is_not(None), names.c.name.not_in(select(Products.name)))).group_by(names.c.name)))
+
+    for model in referencing_models:
+        table = model.__table__
+        connection.execute(update(table).where(and_(table.c.product_id.is_(None), table.c.product_name.is_not(None))).values(
+            product_id=select(Products.id).where(Products.name == table.c.product_name).scalar_subquery()))
+
+
+# ? (version, name, upgrade), never edit or reorder applied entries, add new ones at the end.
+# ? Upgrades only add to the schema and must be idempotent, databases from before the versioning ran some of them already.
+MIGRATIONS = [
+    (1, "barcode stems", add_barcode_stems),
+    (2, "archive indexes", add_archive_indexes),
+    (3, "inventory fulltext index", create_fulltext_index),
+    (4, "query indexes", add_query_indexes),
+    (5, "product catalog", add_product_catalog),
+]
+
+
+SCHEMA_LOCK_NAME = "inventory_schema_upgrade"
+SCHEMA_LOCK_TIMEOUT = 300   # seconds
+
+
+def upgrade_schema():
+    # ? db.create_all() only creates missing tables, existing ones are brought up to date here
+    # ? Workers starting together would run the same DDL at once and the loser fails on "duplicate column/key name",
+    # ? so on MySQL the upgrades are serialized with a named lock held by a connection of its own
+    with db.engine.connect() as lock_connection:
+        locked = lock_connection.dialect.name == "mysql"
+        if locked and lock_connection.execute(text("SELECT GET_LOCK(:name, :timeout)"), {
+                "name": SCHEMA_LOCK_NAME, "timeout": SCHEMA_LOCK_TIMEOUT}).scalar() != 1:
+            raise RuntimeError("[SCHEMA] Timed out waiting for another worker to finish upgrading the schema")
+
+        try:
+            apply_migrations()
+        finally:
+            if locked:
+                lock_connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": SCHEMA_LOCK_NAME})
+
+
+def apply_migrations():
+    # ? Read after taking the lock, the previous holder may have applied everything already
+    with db.engine.connect() as connection:
+        applied = {row.version for row in connection.execute(
+            select(SchemaVersion.version))}
+
+    for version, name, upgrade in MIGRATIONS:
+        if version in applied:
+            continue
+
+        try:
+            with db.engine.begin() as connection:
+                upgrade(connection)
+                connection.execute(insert(SchemaVersion).values(
+                    version=version, name=name, applied_at=datetime.now()))
+        except IntegrityError:
+            # ? Another worker applied the same migration in the meantime (no lock outside MySQL)
+            continue
+        print(f"[SCHEMA] Applied migration {version} ({name})")
@@ -0,0 +1,242 @@
+import heapq
+import re
+from datetime import datetime, timedelta
+from threading import Lock
+from time import monotonic
+from sqlalchemy import and_, case, event, inspect, or_, text
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models.Inventory import Inventory
+from config import Config
+
+
+FULLTEXT_INDEX = "ix_inventory_product_name_fulltext"
+FULLTEXT_MIN_TERM = 3   # ? InnoDB's default innodb_ft_min_token_size
+
+
+def search_terms(search: str) -> list:
+    return [term for term in re.split(r"\W+", search.lower()) if term]
+
+
+def trigrams(value: str) -> set:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class TrigramIndex:
+    """In-process trigram index over the lot product names, used when the database has no FULLTEXT support.
+
+    Changes made through this process are applied on commit, changes made by other processes are picked up
+    from `modified_at` every SEARCH_INDEX_REFRESH seconds. Lots deleted elsewhere are dropped by an id scan
+    every SEARCH_INDEX_PRUNE seconds.
+    """
+
+    def __init__(self):
+        self.names = {}         # lot id -> lowercase product name
+        self.postings = {}      # trigram -> lot ids
+        self.built = False
+        self.refreshed_at = None
+        self.checked_at = 0
+        self.pruned_at = 0
+        self.lock = Lock()
+
+    def add(self, lot_id: str, product_name: str):
+        self.remove(lot_id)
+        name = (product_name or "").lower()
+        self.names[lot_id] = name
+        for trigram in trigrams(name):
+            self.postings.setdefault(trigram, set()).add(lot_id)
+
+    def remove(self, lot_id: str):
+        name = self.names.pop(lot_id, None)
+        if name is None:
+            return
+        for trigram in trigrams(name):
+            postings = self.postings.get(trigram)
+            if postings is not None:
+                postings.discard(lot_id)
+                if len(postings) == 0:
+                    del self.postings[trigram]
+
+    def apply(self, changed: dict, deleted: set):
+        with self.lock:
+            if not self.built:
+                return
+            for lot_id, product_name in changed.items():
+                self.add(lot_id, product_name)
+            for lot_id in deleted:
+                self.remove(lot_id)
+
+    def invalidate(self):
+        with self.lock:
+            self.built = False
+
+    def ensure_fresh(self):
+        with self.lock:
+            if self.built and monotonic() - self.checked_at < Config.SEARCH_INDEX_REFRESH:
+                return
+
+            started_at = datetime.now()
+            if not self.built:
+                self.names.clear()
+                self.postings.clear()
+                lots = Inventory.query.with_entities(
+                    Inventory.id, Inventory.product_name).all()
+            else:
+                # ? Lots touched by other processes, with some slack for clock skew and long transactions
+                lots = Inventory.query.with_entities(Inventory.id, Inventory.product_name).filter(
+                    Inventory.modified_at >= self.refreshed_at - timedelta(minutes=1)).all()
+
+            for lot in lots:
+                self.add(lot.id, lot.product_name)
+
+            if not self.built:
+                self.pruned_at = monotonic()
+            elif monotonic() - self.pruned_at >= Config.SEARCH_INDEX_PRUNE:
+                # ? Deleted and archived lots leave no modified_at behind, find them by the ids that are gone
+                present = {lot.id for lot in Inventory.query.with_entities(Inventory.id)}
+                for lot_id in [lot_id for lot_id in self.names if lot_id not in present]:
+                    self.remove(lot_id)
+                self.pruned_at = monotonic()
+
+            self.built = True
+            self.refreshed_at = started_at
+            self.checked_at = monotonic()
+
+    def search(self, search: str) -> dict:
+        """Returns {lot id: relevance} of the lots whose product name contains every term of `search`."""
+        terms = search_terms(search)
+        if len(terms) == 0:
+            return {}
+
+        self.ensure_fresh()
+        with self.lock:
+            candidates = None
+            for term in terms:
+                for trigram in trigrams(term):
+                    postings = self.postings.get(trigram, set())
+                    candidates = set(postings) if candidates is None else candidates & postings
+            if candidates is None:
+                # ? Terms shorter than a trigram can't be looked up, check every name instead
+                candidates = self.names.keys()
+
+            scores = {}
+            for lot_id in candidates:
+                name = self.names[lot_id]
+                words = search_terms(name)
+                score = 0
+                for term in terms:
+                    if term not in name:
+                        score = None
+                        break
+                    # ? Whole words rank above word prefixes, which rank above matches inside a word
+                    score += 3 if term in words else 2 if any(word.startswith(term)
+                                                               for word in words) else 1
+                if score is not None:
+                    scores[lot_id] = score + (1 if name.startswith(terms[0]) else 0)
+            return scores
+
+
+trigram_index = TrigramIndex()
+
+
+def fulltext_available() -> bool:
+    return db.engine.dialect.name == "mysql"
+
+
+def create_fulltext_index(connection):
+    if connection.dialect.name != "mysql":
+        return False
+    if FULLTEXT_INDEX in [index['name'] for index in inspect(connection).get_indexes(Inventory.__tablename__)]:
+        return False
+
+    connection.execute(
+        text(f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} ON {Inventory.__tablename__} (product_name)"))
+    return True
+
+
+def search_inventory(query, search: str) -> tuple:
+    """Filters an Inventory query by `search`, returns (query, relevance order by clause)."""
+    terms = search_terms(search)
+    # ? Lot ids are still matched by prefix, which the primary key index can answer
+    id_match = Inventory.id.like(search.replace("%", "").replace("_", "") + "%")
+
+    if fulltext_available():
+        indexed_terms = [term for term in terms if len(term) >= FULLTEXT_MIN_TERM]
+        short_terms = [term for term in terms if len(term) < FULLTEXT_MIN_TERM]
+
+        conditions = [Inventory.product_name.like(f"%{term}%") for term in short_terms]
+        relevance = None
+        if len(indexed_terms) > 0:
+            relevance = match(Inventory.product_name, against=" ".join(
+                f"+{term}*" for term in indexed_terms)).in_boolean_mode()
+            conditions.append(relevance)
+        if len(conditions) == 0:
+            return query.filter(id_match), None
+
+        return query.filter(or_(and_(*conditions), id_match)), relevance.desc() if relevance is not None else None
+
+    scores = trigram_index.search(search)
+    if len(scores) == 0:
+        return query.filter(id_match), None
+
+    if len(scores) > Config.SEARCH_MAX_CANDIDATES:
+        # ? Too many matches for an IN list, filter them with LIKE (what the index matched) and only rank the best ones
+        top_scores = dict(heapq.nsmallest(Config.SEARCH_MAX_CANDIDATES, scores.items(),
+                                          key=lambda item: (-item[1], item[0])))
+        return query.filter(or_(and_(*[Inventory.product_name.contains(term, autoescape=True) for term in terms]), id_match)), case(
+            top_scores, value=Inventory.id, else_=0).desc()
+
+    return query.filter(or_(Inventory.id.in_(scores.keys()), id_match)), case(scores, value=Inventory.id, else_=0).desc()
+
+
+def register_search_changes(session, changed: dict, deleted: set = ()):
+    # ? Applied to the index once the session commits
+    pending = session.info.setdefault("search_index_pending", [{}, set()])
+    for lot_id, product_name in changed.items():
+        pending[0][lot_id] = product_name
+        pending[1].discard(lot_id)
+    for lot_id in deleted:
+        pending[0].pop(lot_id, None)
+        pending[1].add(lot_id)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_search_changes(session, flush_context):
+    changed = {obj.id: obj.product_name for obj in list(session.new) + list(session.dirty)
+               if isinstance(obj, Inventory) and obj not in session.deleted}
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, Inventory)}
+
+    if len(changed) > 0 or len(deleted) > 0:
+        register_search_changes(session, changed, deleted)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_search_changes(session):
+    if session.info.pop("search_index_stale", False):
+        trigram_index.invalidate()
+
+    pending = session.info.pop("search_index_pending", None)
+    if pending is not None:
+        trigram_index.apply(*pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_search_changes(session):
+    session.info.pop("search_index_stale", None)
+    session.info.pop("search_index_pending", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def invalidate_bulk_search_changes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.statement.table.name != Inventory.__tablename__:
+        return
+
+    # ? Statements that register their changes themselves or don't change lot ids or names opt out with this execution option
+    if orm_execute_state.execution_options.get("search_index_synced"):
+        return
+
+    orm_execute_state.session.info["search_index_stale"] = True
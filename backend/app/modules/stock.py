@@ -0,0 +1,64 @@
+from decimal import Decimal
+from sqlalchemy import and_, update
+
+from app.extensions import db
+from app.models.Inventory import Inventory
+from app.modules.lookup_cache import invalidate_products
+from app.utils import barcode_stem
+
+
+MAX_DECREMENT_ROUNDS = 10
+
+
+def take_from_lot(lot_id: str, quantity: Decimal) -> bool:
+    # ? Only succeeds if the lot still holds the quantity, concurrent sales of the same lot can't overdraw it
+    result = db.session.execute(update(Inventory).where(and_(Inventory.id == lot_id, Inventory.product_remain >= quantity)).values(
+        product_remain=Inventory.product_remain - quantity).execution_options(lookup_cache_synced=True, search_index_synced=True, synchronize_session=False))
+    return result.rowcount == 1
+
+
+def decrement_stock(product_barcode: str, quantity: Decimal) -> Decimal:
+    """Takes `quantity` from the product's lots, oldest first, returns the quantity that could not be covered."""
+    stem = barcode_stem(product_barcode)
+    remaining = Decimal(quantity)
+    touched_lots = set()
+
+    for _ in range(MAX_DECREMENT_ROUNDS):
+        # ? A locking read sees the latest committed stock (a plain SELECT would keep returning the transaction's
+        # ? snapshot under REPEATABLE READ) and holds the lots until the sale is committed
+        lots = Inventory.query.with_entities(Inventory.id, Inventory.product_remain).filter(and_(Inventory.product_barcode_stem == stem, Inventory.product_barcode == product_barcode, Inventory.product_remain > 0)).order_by(
+            Inventory.inventory_date.asc(), Inventory.id.asc()).with_for_update().all()
+        if len(lots) == 0:
+            break
+
+        for lot in lots:
+            take = min(remaining, lot.product_remain)
+            if not take_from_lot(lot.id, take):
+                # ? Only possible where the database ignores FOR UPDATE, keep going with the next lot
+                continue
+            touched_lots.add(lot.id)
+            remaining -= take
+            if remaining == 0:
+                break
+
+        if remaining == 0:
+            break
+
+    if len(touched_lots) > 0:
+        invalidate_products(db.session, {stem}, touched_lots)
+
+    if remaining > 0:
+        print(
+            f"[STOCK] Not enough stock of '{product_barcode}' to cover the sale, {remaining} left uncovered")
+    return remaining
+
+
+def decrement_stock_many(quantities: list) -> dict:
+    """Decrements (product barcode, quantity) pairs, returns {product barcode: uncovered quantity}."""
+    totals = {}
+    for product_barcode, quantity in quantities:
+        totals[product_barcode] = totals.get(
+            product_barcode, Decimal(0)) + quantity
+
+    # ? Always lock the lots in the same order so concurrent callers can't deadlock
+    return {product_barcode: decrement_stock(product_barcode, totals[product_barcode]) for product_barcode in sorted(totals)}
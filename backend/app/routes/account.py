@@ -1,7 +1,7 @@
 from flask import Blueprint, jsonify, make_response, request
 from werkzeug.security import generate_password_hash
 
-from app.middleware.tokenValidator import token_required
+from app.middleware.tokenValidator import evict_cached_user, token_required
 from app.models.Users import Users
 from app.extensions import db
 from app.utils import safe_uuid
@@ -63,6 +63,7 @@ def account_update(user, id):
     if not account:
         return make_response(jsonify({"message": "Account not found"}), 404)
 
+    old_public_id = account.public_id
     data = request.get_json()
     for key, value in data.items():
         if value == "":
@@ -74,6 +75,7 @@ def account_update(user, id):
             account.public_id = safe_uuid()
 
     db.session.commit()
+    evict_cached_user(old_public_id, account.public_id)
 
     return make_response(jsonify({"message": "Account updated!"}), 200)
 
@@ -88,8 +90,10 @@ def account_delete(user, id):
     if not account:
         return make_response(jsonify({"message": "Account not found"}), 404)
 
+    public_id = account.public_id
     db.session.delete(account)
     db.session.commit()
+    evict_cached_user(public_id)
 
     return make_response(jsonify({"message": "Account deleted!"}), 200)
 
@@ -101,10 +105,12 @@ def account_change_password(user):
     if data.get('new_password') in [None, '']:
         return make_response(jsonify({"message": "Missing required parameter"}), 400)
 
-    user.password = generate_password_hash(
+    account = db.session.get(Users, user.id)
+    account.password = generate_password_hash(
         data['new_password'], method='scrypt')
-    user.public_id = safe_uuid()
+    account.public_id = safe_uuid()
 
     db.session.commit()
+    evict_cached_user(user.public_id)
 
     return make_response(jsonify({"message": "Password changed!"}), 200)
@@ -1,22 +1,70 @@
 from datetime import datetime
 from flask import Blueprint, jsonify, make_response, request
+from sqlalchemy import or_
 
 from app.middleware.tokenValidator import token_required
 from app.models.ArchivedInventory import ArchivedInventory
 from app.extensions import db
 from app.models.Inventory import Inventory
+from app.modules.exports import EXPORT_FORMATS, export_response
+from app.modules.inventory_archival import archive_lots, disposable_lots, expired_lots
+from app.utils import keyset_page, parse_page_size
 
 
 archive = Blueprint('archive', __name__, url_prefix='/api/archive')
 
 
+def filtered_archive():
+    result = ArchivedInventory.query
+
+    #! Date filtering
+    if 'dateFrom' in request.args or 'dateTo' in request.args:
+        dateFrom = request.args.get(
+            'dateFrom') if 'dateFrom' in request.args else datetime.min
+        dateTo = request.args.get(
+            'dateTo') if 'dateTo' in request.args else datetime.now()
+
+        result = result.filter(ArchivedInventory.archived_at.between(
+            dateFrom, dateTo))
+
+    if 'barcode' in request.args:
+        result = result.filter(
+            ArchivedInventory.product_barcode == request.args['barcode'])
+
+    if 'product_name' in request.args:
+        result = result.filter(ArchivedInventory.product_name.contains(
+            request.args['product_name']))
+
+    if 'archived_by' in request.args:
+        result = result.filter(ArchivedInventory.archived_by ==
+                               int(request.args['archived_by']))
+
+    return result
+
+
 @archive.route('')
 @token_required
 def get_archive(user):
     if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
         return make_response(jsonify({"message": "Forbidden"}), 403)
 
-    archived_inventory = ArchivedInventory.query.order_by(
+    try:
+        result = filtered_archive()
+    except ValueError:
+        return make_response(jsonify({"message": "Invalid filter value"}), 400)
+
+    #! Cursor pagination
+    if 'cursor' in request.args or 'page_size' in request.args:
+        try:
+            page_size = parse_page_size(request.args.get('page_size'))
+            archived_inventory, next_cursor = keyset_page(result, ArchivedInventory.archived_at, ArchivedInventory.id, True, request.args.get(
+                'cursor'), page_size, "archived_at:desc")
+        except ValueError as ex:
+            return make_response(jsonify({"message": str(ex)}), 400)
+
+        return make_response(jsonify({"items": [archived.serialize() for archived in archived_inventory], "next_cursor": next_cursor}))
+
+    archived_inventory = result.order_by(
         ArchivedInventory.archived_at.desc()).all()
 
     serialized_result = [archived.serialize()
@@ -25,6 +73,25 @@ def get_archive(user):
     return make_response(jsonify(serialized_result))
 
 
+@archive.route('/export')
+@token_required
+def export_archive(user):
+    if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
+        return make_response(jsonify({"message": "Forbidden"}), 403)
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return make_response(jsonify({"message": "Unsupported export format"}), 400)
+
+    try:
+        archived_inventory = filtered_archive().order_by(
+            ArchivedInventory.archived_at.desc(), ArchivedInventory.id)
+    except ValueError:
+        return make_response(jsonify({"message": "Invalid filter value"}), 400)
+
+    return export_response(archived_inventory, lambda archived: archived.serialize(), export_format, "archive")
+
+
 @archive.route('/<id>')
 @token_required
 def get_archive_by_id(user, id):
@@ -83,6 +150,7 @@ def add_archive(user):
 
     new_archive = ArchivedInventory(
         id=inventory.id,
+        product_id=inventory.product_id,
         product_name=inventory.product_name,
         product_barcode=inventory.product_barcode,
         base_price=inventory.base_price,
@@ -100,3 +168,28 @@ def add_archive(user):
     db.session.commit()
 
     return make_response(jsonify({"message": "Item archived successfully!"}), 200)
+
+
+@archive.route('/bulk', methods=['POST'])
+@token_required
+def add_archive_bulk(user):
+    if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
+        return make_response(jsonify({"message": "Forbidden"}), 403)
+
+    data = request.get_json()
+
+    #! Lots can be picked by id, or all expired lots / lots suggested for disposal at once
+    filters = []
+    if isinstance(data.get('inventory_ids'), list) and len(data['inventory_ids']) > 0:
+        filters.append(Inventory.id.in_(data['inventory_ids']))
+    if data.get('expired') == True:
+        filters.append(expired_lots())
+    if data.get('dispose_suggestions') == True:
+        filters.append(disposable_lots())
+
+    if len(filters) == 0:
+        return make_response(jsonify({"message": "Missing required fields"}), 400)
+
+    archived = archive_lots(or_(*filters), user.id)
+
+    return make_response(jsonify({"message": f"{archived} items archived successfully!", "archived": archived}), 200)
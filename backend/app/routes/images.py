@@ -1,12 +1,13 @@
 from io import BytesIO
 import os
-from glob import glob
-from flask import Blueprint, jsonify, make_response, redirect, request, send_file
+from flask import Blueprint, jsonify, make_response, redirect, request
+from werkzeug.utils import send_file
 
 from app.middleware.tokenValidator import token_required
 from app.models.Inventory import Inventory
+from app.modules.inventory_images import IMAGE_FORMATS, VARIANT_SIZES, image_paths, image_status, pick_image_file, store_upload
 from config import Config
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 
 
 inv_images = Blueprint('inv_imgs', __name__)
@@ -19,6 +20,18 @@ def file_extension(filename):
            filename.rsplit('.', 1)[1].lower()
 
 
+def send_image(filename: str):
+    # ? ETag, Last-Modified and conditional requests (304, ranges) are handled by werkzeug. The URL of a lot's image
+    # ? doesn't change on re-upload, so clients revalidate every time (no-cache) and get a 304 while it is unchanged
+    response = send_file(os.path.join(os.getcwd(), Config.UPLOAD_FOLDER, filename), request.environ,
+                         max_age=0, use_x_sendfile=Config.IMAGE_OFFLOAD in ["x-sendfile", "x-accel-redirect"])
+
+    if Config.IMAGE_OFFLOAD == "x-accel-redirect" and 'X-Sendfile' in response.headers:
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = Config.IMAGE_ACCEL_PREFIX + filename
+    return response
+
+
 @inv_images.route('/api/inventory/<id>/image', methods=['POST'])
 @token_required
 def upload_image(user, id):
@@ -32,33 +45,47 @@ def upload_image(user, id):
         return make_response(jsonify({"message": f"Lot with ID '{id}' not found"}), 404)
 
     if request.content_type in ALLOWED_TYPES.keys():
-        filename = f"{id}.{ALLOWED_TYPES[request.content_type]}"
-        with open(os.path.join(Config.UPLOAD_FOLDER, filename), 'wb') as file:
-            resized = Image.open(BytesIO(filedata)).convert('RGB')
-            resized.thumbnail((500, 500))
-            resized.save(file, optimize=True, quality=80,
-                         format=ALLOWED_TYPES[request.content_type])
-        return make_response(jsonify({"message": "File uploaded", "filename": filename}), 200)
+        # ? Only the header is read here, decoding and resizing happen in the background
+        try:
+            image_format = Image.open(BytesIO(filedata)).format
+        except UnidentifiedImageError:
+            image_format = None
+        if image_format not in IMAGE_FORMATS:
+            return make_response(jsonify({"message": "Invalid image data"}), 400)
+
+        store_upload(id, filedata)
+        filename = f"{id}.{IMAGE_FORMATS[image_format]}"
+        return make_response(jsonify({"message": "File uploaded", "filename": filename, "status": "processing"}), 200)
 
     return make_response(jsonify({"message": f"Unsupported media type '{request.content_type}'"}), 400)
 
 
-@inv_images.route('/api/inventory/<id>/image', methods=['GET'])
-def get_image(id):
-    lot = Inventory.query.filter_by(id=id).first()
-    if lot is None:
+@inv_images.route('/api/inventory/<id>/image/status', methods=['GET'])
+def get_image_status(id):
+    kind, _ = image_paths.get(id)
+    if kind is None:
         return make_response(jsonify({"message": f"Lot with ID '{id}' not found"}), 404)
 
-    filename = lot.product_image
+    return make_response(jsonify({"status": image_status(id, kind)}), 200)
+
+
+@inv_images.route('/api/inventory/<id>/image', methods=['GET'])
+def get_image(id):
+    size = request.args.get('size', 'original')
+    image_format = request.args.get('format')
+    if size not in ['original', *VARIANT_SIZES] or image_format not in [None, 'webp']:
+        return make_response(jsonify({"message": "Unsupported image size or format"}), 400)
 
-    if filename and filename != "internal":
-        return redirect(filename)
-    elif not filename:
-        return make_response(send_file(f"{os.getcwd()}/{Config.UPLOAD_FOLDER}fallback.jpg"), 200)
+    kind, value = image_paths.get(id)
+    if kind is None:
+        return make_response(jsonify({"message": f"Lot with ID '{id}' not found"}), 404)
 
-    file_search = glob(f"{Config.UPLOAD_FOLDER}{id}.*")
+    if kind == "redirect":
+        return redirect(value)
 
-    if len(file_search) == 0:
-        return make_response(send_file(f"{os.getcwd()}/{Config.UPLOAD_FOLDER}fallback.jpg"), 200)
+    filename = pick_image_file(id, value, size, image_format) if kind == "files" else None
+    if filename is None:
+        # ? Until the lot gets its own image, e.g. once its upload is processed
+        return send_image("fallback.jpg")
 
-    return make_response(send_file(os.getcwd() + "/" + file_search[0]), 200)
+    return send_image(filename)
@@ -1,14 +1,19 @@
 from datetime import datetime, date
-from glob import glob
-import os
+from decimal import ROUND_HALF_UP, Decimal
 import uuid
 from flask import Blueprint, jsonify, make_response, request
-from sqlalchemy import desc, or_
+from sqlalchemy import desc, insert
 from app.models.Inventory import Inventory
 import json
 
 from app.middleware.tokenValidator import token_required
 from app.extensions import db
+from app.modules.exports import EXPORT_FORMATS, export_response
+from app.modules.inventory_cleanup import remove_lot_images
+from app.modules.lookup_cache import invalidate_products
+from app.modules.products import product_ids
+from app.modules.search_index import register_search_changes, search_inventory
+from app.utils import barcode_stem, keyset_page, parse_page_size
 from config import Config
 
 
@@ -25,12 +30,7 @@ sort_options = {
 }
 
 
-@inventory.route('')
-@token_required
-def inventory_listing(user):
-    if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
-        return make_response(jsonify({"message": "Forbidden"}), 403)
-
+def filtered_inventory():
     #! Date filtering
     if 'dateFrom' in request.args or 'dateTo' in request.args:
         dateFrom = request.args.get(
@@ -44,25 +44,75 @@ def inventory_listing(user):
         result = Inventory.query
 
     #! Searching
+    relevance = None
     if 'search' in request.args:
-        result = result.filter(or_(Inventory.product_name.contains(
-            request.args['search']), Inventory.id.contains(request.args['search'])))
+        result, relevance = search_inventory(result, request.args['search'])
+
+    return result, relevance
 
-    #! Sorting
-    if request.args.get('sort_by') in sort_options:
-        sort_by = sort_options[request.args.get('sort_by')]
-        if request.args.get('sort_order') == 'desc':
-            sort_by = desc(sort_by)
-        result = result.order_by(sort_by)
 
-    #! Pagination
+@inventory.route('')
+@token_required
+def inventory_listing(user):
+    if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
+        return make_response(jsonify({"message": "Forbidden"}), 403)
+
+    result, relevance = filtered_inventory()
+
+    #! Pagination (legacy clients)
     if 'limit' in request.args and 'offset' in request.args:
-        result = result.limit(int(request.args['limit'])).offset(
-            int(request.args['offset']))
+        #! Sorting
+        if request.args.get('sort_by') in sort_options:
+            sort_by = sort_options[request.args.get('sort_by')]
+            if request.args.get('sort_order') == 'desc':
+                sort_by = desc(sort_by)
+            result = result.order_by(sort_by)
+        elif relevance is not None:
+            result = result.order_by(relevance, Inventory.id)
+
+        try:
+            limit = parse_page_size(request.args['limit'])
+        except ValueError as ex:
+            return make_response(jsonify({"message": str(ex)}), 400)
+        if not request.args['offset'].isdigit():
+            return make_response(jsonify({"message": "Invalid offset."}), 400)
+        offset = int(request.args['offset'])
+
+        serialized_result = [item.serialize() for item in result.limit(limit).offset(offset).all()]
+        return make_response(jsonify(serialized_result))
+
+    #! Cursor pagination, unpaged calls get the first page instead of the whole table
+    sort_key = request.args.get('sort_by') if request.args.get(
+        'sort_by') in sort_options else 'id'
+    descending = request.args.get('sort_order') == 'desc'
+    try:
+        page_size = parse_page_size(request.args.get('page_size'))
+        lots, next_cursor = keyset_page(result, sort_options[sort_key], Inventory.id, descending, request.args.get(
+            'cursor'), page_size, f"{sort_key}:{'desc' if descending else 'asc'}")
+    except ValueError as ex:
+        return make_response(jsonify({"message": str(ex)}), 400)
 
-    serialized_result = [item.serialize() for item in result.all()]
+    return make_response(jsonify({"items": [item.serialize() for item in lots], "next_cursor": next_cursor}))
 
-    return make_response(jsonify(serialized_result))
+
+@inventory.route('/export')
+@token_required
+def inventory_export(user):
+    if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
+        return make_response(jsonify({"message": "Forbidden"}), 403)
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return make_response(jsonify({"message": "Unsupported export format"}), 400)
+
+    result, _ = filtered_inventory()
+
+    #! Sorting
+    sort_by = sort_options.get(request.args.get('sort_by'), Inventory.id)
+    if request.args.get('sort_order') == 'desc':
+        sort_by = desc(sort_by)
+
+    return export_response(result.order_by(sort_by), lambda item: item.serialize(), export_format, "inventory")
 
 
 @inventory.route('/<id>')
@@ -110,6 +160,107 @@ def inventory_insert(user):
     return make_response(jsonify(new_product.serialize()), 201)
 
 
+def validate_lot(data) -> tuple:
+    """Returns (column values, errors) for one lot of a batch intake."""
+    if not isinstance(data, dict):
+        return None, ["Expected an object"]
+
+    errors = []
+    values = {
+        "product_name": data.get('product_name'),
+        "product_image": data.get('product_image'),
+        "product_barcode": data.get('product_barcode')
+    }
+
+    if not isinstance(values["product_name"], str) or not 0 < len(values["product_name"]) <= 255:
+        errors.append("Invalid product_name")
+    if not isinstance(values["product_barcode"], str) or not 0 < len(values["product_barcode"]) <= 25:
+        errors.append("Invalid product_barcode")
+
+    for field in ['product_amount', 'product_remain', 'base_price']:
+        # ? Checked against the column's precision and scale, an out of range value would fail the whole insert
+        column_type = Inventory.__table__.c[field].type
+        try:
+            values[field] = Decimal(str(data[field]))
+            if not values[field].is_finite() or values[field] < 0:
+                raise ValueError
+            values[field] = values[field].quantize(
+                Decimal(1).scaleb(-column_type.scale), rounding=ROUND_HALF_UP)
+            if values[field] >= Decimal(10) ** (column_type.precision - column_type.scale):
+                raise ValueError
+        except (KeyError, ValueError, ArithmeticError):
+            errors.append(f"Invalid {field}")
+
+    try:
+        values["inventory_date"] = datetime.strptime(
+            data['inventory_date'], "%Y.%m.%d %H:%M")
+    except (KeyError, TypeError, ValueError):
+        errors.append("Invalid inventory_date")
+
+    try:
+        values["expiry_date"] = datetime.strptime(
+            data['expiry_date'], "%Y.%m.%d").date() if 'expiry_date' in data else None
+    except (TypeError, ValueError):
+        errors.append("Invalid expiry_date")
+
+    if not isinstance(data.get('modifiable'), bool):
+        errors.append("Invalid modifiable")
+    values["modifiable"] = data.get('modifiable')
+
+    return values, errors
+
+
+@inventory.route('/batch', methods=['POST'])
+@token_required
+def inventory_insert_batch(user):
+    if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
+        return make_response(jsonify({"message": "Forbidden"}), 403)
+
+    data = request.get_json()
+    lots = data.get('lots') if isinstance(data, dict) else data
+
+    if not isinstance(lots, list) or len(lots) == 0:
+        return make_response(jsonify({"message": "Expected a non-empty list of lots"}), 400)
+    if len(lots) > Config.MAX_INTAKE_BATCH:
+        return make_response(jsonify({"message": f"At most {Config.MAX_INTAKE_BATCH} lots can be added at once"}), 413)
+
+    #! Validate every lot before inserting anything
+    rows = []
+    results = []
+    for index, lot in enumerate(lots):
+        values, errors = validate_lot(lot)
+        if len(errors) > 0:
+            results.append({"index": index, "status": "invalid", "errors": errors})
+            continue
+
+        values["id"] = str(uuid.uuid4())
+        # ? Bulk inserts skip the model's validators, so the stem is set here
+        values["product_barcode_stem"] = barcode_stem(values["product_barcode"])
+        values["added_by"] = user.id
+        values["modified_by"] = None
+        values["modified_at"] = datetime.now()
+        rows.append(values)
+        results.append({"index": index, "status": "created", "id": values["id"]})
+
+    if len(rows) < len(lots):
+        return make_response(jsonify({"message": "Some lots are invalid, nothing was added", "results": [result for result in results if result["status"] == "invalid"]}), 400)
+
+    # ? Bulk inserts skip the flush, so the catalog ids are looked up here as well
+    ids = product_ids(db.session, {
+                      row["product_name"]: row["product_barcode"] for row in rows})
+    for row in rows:
+        row["product_id"] = ids[row["product_name"]]
+
+    db.session.execute(insert(Inventory).execution_options(
+        lookup_cache_synced=True, search_index_synced=True), rows)
+    invalidate_products(db.session, {row["product_barcode_stem"] for row in rows})
+    register_search_changes(
+        db.session, {row["id"]: row["product_name"] for row in rows})
+    db.session.commit()
+
+    return make_response(jsonify({"results": results}), 201)
+
+
 @inventory.route('/<id>', methods=['PUT'])
 @token_required
 def inventory_update(user, id):
@@ -126,7 +277,7 @@ def inventory_update(user, id):
                 # convert date strings to datetime and date objects
                 value = datetime.strptime(value, "%Y.%m.%d %H:%M") if key == 'inventory_date' else datetime.strptime(
                     value, "%Y.%m.%d").date()
-            if key in ['added_by', 'modified_by', 'modified_at']:
+            if key in ['added_by', 'modified_by', 'modified_at', 'product_barcode_stem', 'product_id']:
                 # ignore these fields as they should not be modifiable by the user
                 continue
             setattr(lot, key, value)
@@ -150,14 +301,10 @@ def inventory_delete(user, id):
     if lot is None:
         return make_response(jsonify({"message": f"Lot with ID '{id}' not found"}), 404)
 
-    file_search = glob(f"{Config.UPLOAD_FOLDER}{id}.*")
-    try:
-        for file in file_search:
-            os.remove(file)
-    except:
-        pass
-
     db.session.delete(lot)
     db.session.commit()
 
+    # ? After the commit, so an upload still being processed sees the lot is gone and drops its files
+    remove_lot_images({id})
+
     return make_response(jsonify({"message": f"Lot with ID '{id}' deleted"}), 418)
@@ -9,6 +9,7 @@ from app.middleware.tokenValidator import token_required
 from app.models.ActiveModifications import ActiveModifications
 from app.models.Inventory import Inventory
 from app.models.Users import Users
+from app.modules.exports import EXPORT_FORMATS, export_response
 from app.utils import generate_code128_barcode
 from config import Config
 
@@ -17,28 +18,47 @@ price_changes = Blueprint('price_changes', __name__,
                           url_prefix='/api/price_changes')
 
 
+def price_changes_query():
+    return ActiveModifications.query.with_entities(ActiveModifications, Inventory.product_name, Inventory.product_barcode, Users.name).join(Inventory, (Inventory.id == ActiveModifications.inventory_id)).order_by(
+        ActiveModifications.approved_at.desc()).join(Users, (Users.id == ActiveModifications.approved_by), isouter=True)
+
+
+def serialize_price_change(item) -> dict:
+    serialized_item = item[0].serialize()
+    serialized_item['product_name'] = item[1]
+    serialized_item['is_lot_level'] = item[2] == serialized_item['modification_barcode']
+    serialized_item['approved_by'] = item[3]
+    return serialized_item
+
+
 @price_changes.route('')
 @token_required
 def price_changes_listing(user):
     if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
         return make_response(jsonify({"message": "Forbidden"}), 403)
 
-    result = ActiveModifications.query.with_entities(ActiveModifications, Inventory.product_name, Inventory.product_barcode, Users.name).join(Inventory, (Inventory.id == ActiveModifications.inventory_id)).order_by(
-        ActiveModifications.approved_at.desc()).join(Users, (Users.id == ActiveModifications.approved_by), isouter=True).all()
+    result = price_changes_query().all()
 
     # return make_response(str(result), 200)
 
-    serialized_result = []
-    for item in result:
-        serialized_item = item[0].serialize()
-        serialized_item['product_name'] = item[1]
-        serialized_item['is_lot_level'] = item[2] == serialized_item['modification_barcode']
-        serialized_item['approved_by'] = item[3]
-        serialized_result.append(serialized_item)
+    serialized_result = [serialize_price_change(item) for item in result]
 
     return make_response(jsonify(serialized_result))
 
 
+@price_changes.route('/export')
+@token_required
+def price_changes_export(user):
+    if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
+        return make_response(jsonify({"message": "Forbidden"}), 403)
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return make_response(jsonify({"message": "Unsupported export format"}), 400)
+
+    return export_response(price_changes_query().order_by(ActiveModifications.id), serialize_price_change, export_format, "price_changes")
+
+
 @price_changes.route('', methods=['POST'])
 @token_required
 def price_changes_add(user):
@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, make_response
 from sqlalchemy import func, and_
 from app.middleware.tokenValidator import token_required
 
+from app.modules.lookup_cache import cached_product_lookup, product_lookup_cache
 from app.modules.management_suggestions import get_suggestion
 from app.utils import get_quantity_from_barcode, query_product_by_barcode
 
@@ -102,18 +103,27 @@ def product_lookup_by_barcode_short(barcode):
     }
 
     # ? Search for the product by barcode
-    inventory_lookup, changes_lookup = query_product_by_barcode(barcode)
-    if not inventory_lookup:
+    lots, change = cached_product_lookup(barcode)
+    if not lots:
         return make_response(jsonify({"message": "Product not found!"}), 404)
 
-    response['product_name'] = inventory_lookup[0][0].product_name
-    response['product_barcode'] = inventory_lookup[0][0].product_barcode
+    response['product_name'] = lots[0].product_name
+    response['product_barcode'] = lots[0].product_barcode
     response['total_quantity'] = sum(
-        [item[0].product_amount for item in inventory_lookup])
+        [lot.product_amount for lot in lots])
     response['total_remain'] = sum(
-        [item[0].product_remain for item in inventory_lookup])
-    response['base_product_price'] = inventory_lookup[0][0].base_price
-    response['scanned_product_price'] = round((changes_lookup[1] if changes_lookup else response['base_product_price']) * (
-        get_quantity_from_barcode(barcode) if barcode not in [response['product_barcode'], changes_lookup[0] if changes_lookup else None] else 1), 2)
+        [lot.product_remain for lot in lots])
+    response['base_product_price'] = lots[0].base_price
+    response['scanned_product_price'] = round((change.new_price if change else response['base_product_price']) * (
+        get_quantity_from_barcode(barcode) if barcode not in [response['product_barcode'], change.product_barcode if change else None] else 1), 2)
 
     return make_response(jsonify(response))
+
+
+@product_lookup.route('/cache')
+@token_required
+def product_lookup_cache_stats(user):
+    if not user or not set(user.roles).intersection(['ROLE_MANAGER', 'ROLE_DEVELOPER']):
+        return make_response(jsonify({"message": "Forbidden"}), 403)
+
+    return make_response(jsonify(product_lookup_cache.stats()))
@@ -0,0 +1,44 @@
+from flask import Blueprint, jsonify, make_response, request
+
+import app.extensions as extensions
+from app.middleware.tokenValidator import token_required
+from app.modules.sales_ingestion import IngestionError, resolve_transaction
+from config import Config
+
+
+sales = Blueprint('sales', __name__, url_prefix='/api/sales')
+
+
+@sales.route('/transactions', methods=['POST'])
+@token_required
+def ingest_transactions(user):
+    if not user or not set(user.roles).intersection(['ROLE_EMPLOYEE', 'ROLE_DEVELOPER']):
+        return make_response(jsonify({"message": "Forbidden"}), 403)
+
+    data = request.get_json()
+    transactions = data.get('transactions') if isinstance(
+        data, dict) else data
+
+    if not isinstance(transactions, list) or len(transactions) == 0:
+        return make_response(jsonify({"message": "Expected a non-empty list of transactions"}), 400)
+    if len(transactions) > Config.INGEST_MAX_BATCH:
+        return make_response(jsonify({"message": f"At most {Config.INGEST_MAX_BATCH} transactions can be sent at once"}), 413)
+
+    #! Resolve every barcode before anything is stored
+    resolved = []
+    errors = []
+    for index, transaction in enumerate(transactions):
+        try:
+            resolved.append(resolve_transaction(transaction))
+        except IngestionError as ex:
+            errors.append({"index": index, "error": str(ex)})
+
+    if len(errors) > 0:
+        return make_response(jsonify({"message": "Some transactions are invalid, nothing was stored", "errors": errors}), 400)
+
+    try:
+        transaction_ids = extensions.sales_ingestor.submit(resolved)
+    except TimeoutError as ex:
+        return make_response(jsonify({"message": str(ex)}), 503)
+
+    return make_response(jsonify({"transaction_ids": transaction_ids}), 201)
@@ -5,6 +5,7 @@ from app.middleware.tokenValidator import token_required
 from app.models.ActiveModifications import ActiveModifications
 from app.models.SuggestedModifications import SuggestedModifications
 from app.models.Inventory import Inventory
+from app.models.TaskWatermarks import TaskWatermarks
 from app.modules.management_suggestions import generate_suggestions, get_suggestion
 from app.utils import generate_code128_barcode
 import app.extensions as ext
@@ -52,11 +53,13 @@ def request_suggestions(user):
 
         return make_response(jsonify(get_suggestion(lot).serialize()))
     else:
+        full_rebuild = request.args.get('full') == "true"
         if request.args.get('sync') == "true":
-            generate_suggestions()
+            generate_suggestions(incremental=False if full_rebuild else None)
             return make_response(jsonify({"message": "Suggestions generated"}), 200)
         else:
-            ext.task_scheduler.queue_task_asap("auto_suggestions")
+            ext.task_scheduler.queue_task_asap(
+                "full_suggestions" if full_rebuild else "auto_suggestions")
             return make_response(jsonify({"message": "Regenerating suggestions..."}), 202)
 
 
@@ -96,5 +99,7 @@ def delete_suggestions(user):
         return make_response(jsonify({"message": "Forbidden"}), 403)
 
     SuggestedModifications.query.delete()
+    #! Without a watermark the next run rebuilds the suggestions of every lot, not just the changed ones
+    TaskWatermarks.query.filter_by(task="auto_suggestions").delete()
     ext.db.session.commit()
     return make_response(jsonify({"message": "Suggestions deleted"}))
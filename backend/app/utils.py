@@ -1,4 +1,7 @@
+import base64
+from datetime import date, datetime
 from decimal import Decimal
+import json
 from random import randint
 
 from sqlalchemy import and_, or_
@@ -6,19 +9,32 @@ from sqlalchemy import and_, or_
 from app.models.ActiveModifications import ActiveModifications
 from app.models.Inventory import Inventory
 from app.models.Users import Users
+from config import Config
+
+
+def barcode_stem(barcode: str) -> str:
+    # ? Variable quantity barcodes end in "00000" + a check digit, the scanned quantity replaces those digits
+    if barcode and len(barcode) > 6 and barcode[-6:-1] == "00000":
+        return barcode[:-6]
+    return barcode
+
+
+def scanned_barcode_stems(barcode: str) -> list:
+    # ? A scanned barcode is either a product's own barcode or a variable quantity barcode with the quantity filled in
+    return [barcode, barcode[:-6]] if len(barcode) > 6 else [barcode]
 
 
 def query_product_by_barcode(barcode: str) -> tuple:
     # ? Check to see if the given barcode is an active change barcode instead of a product barcode
-    changes_lookup = ActiveModifications.query.with_entities(Inventory.product_barcode, ActiveModifications.new_price).filter(or_(ActiveModifications.modification_barcode == barcode, and_(ActiveModifications.modification_barcode.like(
-        "%00000_"), ActiveModifications.modification_barcode.startswith(barcode[:-6])))).join(Inventory, (ActiveModifications.inventory_id == Inventory.id)).order_by(ActiveModifications.approved_at.desc()).first()
+    changes_lookup = ActiveModifications.query.with_entities(Inventory.product_barcode, ActiveModifications.new_price).filter(and_(ActiveModifications.modification_barcode_stem.in_(scanned_barcode_stems(barcode)), or_(ActiveModifications.modification_barcode == barcode, ActiveModifications.modification_barcode_stem != ActiveModifications.modification_barcode))).join(
+        Inventory, (ActiveModifications.inventory_id == Inventory.id)).order_by(ActiveModifications.approved_at.desc()).first()
 
     if changes_lookup:
         barcode = changes_lookup[0]
 
     # ? Search for the product by barcode
-    inventory_lookup = Inventory.query.with_entities(Inventory, ActiveModifications, Users.name, Users.username).filter(or_(Inventory.product_barcode == barcode, and_(Inventory.product_barcode.like("%00000_"), Inventory.product_barcode.startswith(
-        barcode[:-6])))).outerjoin(ActiveModifications, (Inventory.id == ActiveModifications.inventory_id)).outerjoin(Users, (ActiveModifications.approved_by == Users.id)).order_by(Inventory.inventory_date.desc()).all()
+    inventory_lookup = Inventory.query.with_entities(Inventory, ActiveModifications, Users.name, Users.username).filter(and_(Inventory.product_barcode_stem.in_(scanned_barcode_stems(barcode)), or_(Inventory.product_barcode == barcode, Inventory.product_barcode_stem != Inventory.product_barcode))).outerjoin(
+        ActiveModifications, (Inventory.id == ActiveModifications.inventory_id)).outerjoin(Users, (ActiveModifications.approved_by == Users.id)).order_by(Inventory.inventory_date.desc()).all()
 
     return (inventory_lookup, changes_lookup)
 
@@ -46,3 +62,69 @@ def generate_code128_barcode(internal_number: int, var_qty: bool) -> str:
 
 def get_quantity_from_barcode(barcode: str) -> Decimal:
     return Decimal(barcode[-6:len(barcode)-1]) / Decimal(1000)
+
+
+def encode_cursor(scope: str, value, row_id) -> str:
+    payload = json.dumps([scope, value, row_id], default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str, scope: str, column) -> tuple:
+    try:
+        cursor_scope, value, row_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+    if cursor_scope != scope:
+        raise ValueError("The cursor belongs to a different sort order.")
+
+    # ? Values are serialized as strings, convert them back to the column's type
+    if value is not None:
+        python_type = column.type.python_type
+        if python_type is datetime:
+            value = datetime.fromisoformat(value)
+        elif python_type is date:
+            value = date.fromisoformat(value)
+        elif python_type is Decimal:
+            value = Decimal(value)
+    return value, row_id
+
+
+def parse_page_size(value: str) -> int:
+    try:
+        page_size = int(value) if value is not None else Config.PAGE_SIZE
+    except ValueError:
+        raise ValueError("Invalid page size.")
+
+    if page_size < 1:
+        raise ValueError("Invalid page size.")
+    return min(page_size, Config.MAX_PAGE_SIZE)
+
+
+def keyset_page(query, column, tiebreak, descending: bool, cursor: str, page_size: int, scope: str) -> tuple:
+    """Returns (rows, next cursor) of the page after `cursor`, ordered by (column, tiebreak).
+
+    The position is kept in the cursor, so every page is an indexed range scan instead of an OFFSET that
+    reads and discards all the previous rows. NULLs sort first in ascending order and last in descending order.
+    """
+    if cursor:
+        value, row_id = decode_cursor(cursor, scope, column)
+        if descending:
+            condition = and_(column.is_(None), tiebreak < row_id) if value is None else or_(
+                column < value, and_(column == value, tiebreak < row_id), column.is_(None))
+        else:
+            condition = or_(and_(column.is_(None), tiebreak > row_id), column.is_not(None)) if value is None else or_(
+                column > value, and_(column == value, tiebreak > row_id))
+        query = query.filter(condition)
+
+    order = [column.desc(), tiebreak.desc()] if descending else [
+        column.asc(), tiebreak.asc()]
+    rows = query.order_by(*order).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(scope, getattr(
+            rows[-1], column.key), getattr(rows[-1], tiebreak.key))
+    return rows, next_cursor
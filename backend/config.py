@@ -4,11 +4,59 @@ dotenv_data = dotenv.dotenv_values(".env")
 # dotenv_data = dotenv.dotenv_values(".env.dev")  # for development only
 
 
+def engine_options(uri: str, pool_size: str) -> dict:
+    options = {
+        "pool_recycle": int(dotenv_data.get("DB_POOL_RECYCLE", 280)),
+        "pool_pre_ping": True
+    }
+    # ? In-memory SQLite databases use a static pool without a size
+    if uri and not uri.startswith("sqlite"):
+        options["pool_size"] = int(pool_size)
+        options["max_overflow"] = int(
+            dotenv_data.get("DB_MAX_OVERFLOW", 10))
+    return options
+
+
 class Config:
     INTERNAL_NUMBER = 7
     MOBILE_APP_BUILD = 11
+    LOOKUP_CACHE_SIZE = 4096
+    LOOKUP_CACHE_TTL = 10  # seconds
+    USER_CACHE_TTL = 30  # seconds
+    USER_CACHE_SIZE = 1024
+    PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+    EXPORT_BATCH_SIZE = 1000
+    MAX_INTAKE_BATCH = 1000
+    INGEST_MAX_BATCH = 200
+    INGEST_COMMIT_WAIT = 0.005  # seconds
+    INGEST_TIMEOUT = 10  # seconds
+    SEARCH_INDEX_REFRESH = 5  # seconds
+    SEARCH_INDEX_PRUNE = 300  # seconds
+    SEARCH_MAX_CANDIDATES = 1000
+    REPLICA_STICKY_SECONDS = 5
+    REPLICA_STICKY_SIZE = 4096
+    IMAGE_PATH_CACHE_TTL = 60  # seconds
+    IMAGE_PATH_CACHE_SIZE = 4096
+    IMAGE_WORKERS = 2
+    # ? "none", "x-sendfile" (Apache, lighttpd) or "x-accel-redirect" (nginx, serving UPLOAD_FOLDER under IMAGE_ACCEL_PREFIX)
+    IMAGE_OFFLOAD = dotenv_data.get("IMAGE_OFFLOAD", "none")
+    IMAGE_ACCEL_PREFIX = dotenv_data.get(
+        "IMAGE_ACCEL_PREFIX", "/protected/inventory_images/")
+    REPLICA_BLUEPRINTS = ['inventory', 'archive', 'statistics',
+                          'product_lookup', 'price_changes', 'suggestions']
     BASE_URL = dotenv_data["BASE_URL"]
     SQLALCHEMY_TRACK_MODIFICATIONS = True
     UPLOAD_FOLDER = "static/inventory_images/"
+    CHART_CACHE_FOLDER = "static/chart_cache/"
     SECRET_KEY = dotenv_data["SECRET_KEY"]
     SQLALCHEMY_DATABASE_URI = dotenv_data["SQLALCHEMY_DATABASE_URI"]
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        SQLALCHEMY_DATABASE_URI, dotenv_data.get("DB_POOL_SIZE", 10))
+    # ? Optional read replica for the GET endpoints of REPLICA_BLUEPRINTS
+    SQLALCHEMY_BINDS = {
+        "replica": {
+            "url": dotenv_data["SQLALCHEMY_REPLICA_URI"],
+            **engine_options(dotenv_data["SQLALCHEMY_REPLICA_URI"], dotenv_data.get("DB_REPLICA_POOL_SIZE", 10))
+        }
+    } if dotenv_data.get("SQLALCHEMY_REPLICA_URI") else {}